@@ -0,0 +1,203 @@
+"""
+SPENDING ANALYTICS
+Weekly and monthly spending views, month-over-month deltas, moving
+averages and per-category trends, kept as materialized views over a
+user data store
+"""
+
+import argparse
+import time
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+# View name -> pandas period frequency. Weeks run Monday to Sunday.
+FREQUENCIES = {'W': 'W-SUN', 'M': 'M'}
+
+# Resample rules producing the same periods from daily totals
+_RESAMPLE_RULES = {'W': 'W-SUN', 'M': 'MS'}
+
+# Relative slope (share of the mean per month) below which a trend is flat
+TREND_THRESHOLD = 0.05
+
+def _empty_view(freq):
+    return pd.DataFrame(index=pd.PeriodIndex([], freq=FREQUENCIES[freq]), dtype=float)
+
+class SpendingAnalytics:
+    """Weekly and monthly {period: {category: total}} views over a store
+
+    The views are built once from the store's per-day rollup with a
+    vectorized resample. After that the analytics subscribe to the store:
+    a new or corrected expense marks only the week and month containing it
+    stale, and those periods are re-summed from the rollup the next time a
+    view is read. A reload of the store (another process compacted or
+    rewrote it) drops the views entirely.
+
+    Derived results (month-over-month deltas, moving averages, trends)
+    read a fixed number of trailing periods, so their cost doesn't depend
+    on how long the history is; they are cached until the next change.
+    """
+
+    def __init__(self, store):
+        self.store = store
+        self._views = {}
+        self._stale = {freq: set() for freq in FREQUENCIES}
+        self._derived = {}
+        store.subscribe(self._invalidate)
+
+    def _invalidate(self, days):
+        self._derived.clear()
+        if days is None:
+            self._views.clear()
+            for stale in self._stale.values():
+                stale.clear()
+            return
+        days = pd.PeriodIndex(sorted(days), freq='D')
+        for freq in self._views:
+            self._stale[freq].update(days.asfreq(FREQUENCIES[freq]).unique())
+
+    def _build(self):
+        """Both views from the store's per-day totals"""
+        daily = self.store.daily_totals()
+        if not daily:
+            self._views = {freq: _empty_view(freq) for freq in FREQUENCIES}
+            return
+        frame = pd.DataFrame.from_dict(daily, orient='index').fillna(0.0)
+        frame.index = pd.to_datetime(frame.index)
+        for freq, rule in _RESAMPLE_RULES.items():
+            view = frame.resample(rule).sum().to_period(FREQUENCIES[freq])
+            self._views[freq] = view.sort_index(axis=1)
+
+    def _refresh_stale(self, freq):
+        """Re-sum the stale periods of one view from the store"""
+        stale = self._stale[freq]
+        view = self._views[freq]
+        patch = pd.DataFrame.from_dict(
+            {period: self.store.spending_by_category(period.start_time.date().isoformat(),
+                                                     period.end_time.date().isoformat())
+             for period in stale},
+            orient='index', dtype=float)
+        patch.index = pd.PeriodIndex(list(stale), freq=FREQUENCIES[freq])
+        view = pd.concat([view.drop(index=patch.index, errors='ignore'), patch]).fillna(0.0)
+        # Keep the range contiguous and drop categories corrected away
+        if len(view):
+            view = view.reindex(pd.period_range(view.index.min(), view.index.max(),
+                                                freq=FREQUENCIES[freq]), fill_value=0.0)
+        self._views[freq] = view.loc[:, (view != 0).any()].sort_index(axis=1)
+        stale.clear()
+
+    def _view(self, freq):
+        if freq not in FREQUENCIES:
+            raise ValueError(f"Unknown frequency: {freq}")
+        if freq not in self._views:
+            self._build()
+        if self._stale[freq]:
+            self._refresh_stale(freq)
+        return self._views[freq]
+
+    def _cached(self, key, compute):
+        # Results depend on the current period, so the date is part of the key
+        key = key + (date.today(),)
+        if key not in self._derived:
+            self._derived[key] = compute()
+        return self._derived[key]
+
+    def _trailing(self, freq, periods, end=None):
+        """The last ``periods`` periods of a view up to ``end`` (default: the current one)"""
+        end = end or pd.Period(date.today(), FREQUENCIES[freq])
+        index = pd.period_range(end=end, periods=periods, freq=FREQUENCIES[freq])
+        return self._view(freq).reindex(index, fill_value=0.0)
+
+    def weekly(self, periods=None):
+        """Spending per week (rows) and category (columns)"""
+        view = self._view('W')
+        return view if periods is None else view.tail(periods)
+
+    def monthly(self, periods=None):
+        """Spending per month (rows) and category (columns)"""
+        view = self._view('M')
+        return view if periods is None else view.tail(periods)
+
+    def month_over_month(self, months=12):
+        """Monthly totals with the change from the previous month
+
+        Columns ``total``, ``change`` and ``pct_change``; the last row is
+        the current month. ``pct_change`` is NaN after a month with no
+        spending.
+        """
+        def compute():
+            totals = self._trailing('M', months + 1).sum(axis=1)
+            result = pd.DataFrame({
+                'total': totals,
+                'change': totals.diff(),
+                'pct_change': (totals.diff() / totals.shift()).replace([np.inf, -np.inf], np.nan) * 100
+            })
+            return result.iloc[1:]
+        return self._cached(('mom', months), compute)
+
+    def moving_average(self, freq='W', window=4, periods=26):
+        """Total spending per period with its trailing ``window``-period mean"""
+        def compute():
+            totals = self._trailing(freq, periods + window - 1).sum(axis=1)
+            result = pd.DataFrame({
+                'total': totals,
+                'moving_average': totals.rolling(window).mean()
+            })
+            return result.iloc[window - 1:]
+        return self._cached(('ma', freq, window, periods), compute)
+
+    def category_trends(self, months=6):
+        """Least-squares spending trend per category over the last completed months
+
+        Columns ``mean`` (per month), ``slope`` (change per month),
+        ``pct_per_month`` (slope as a share of the mean) and ``trend``
+        ('rising', 'falling' or 'flat'), ordered by slope.
+        """
+        def compute():
+            last_complete = pd.Period(date.today(), 'M') - 1
+            window = self._trailing('M', months, end=last_complete)
+            values = window.to_numpy()
+            x = np.arange(months, dtype=float)
+            x -= x.mean()
+            mean = values.mean(axis=0)
+            slope = x @ (values - mean) / (x @ x) if months > 1 else np.zeros(len(mean))
+            with np.errstate(divide='ignore', invalid='ignore'):
+                relative = np.where(mean > 0, slope / mean, 0.0)
+            trend = np.where(relative > TREND_THRESHOLD, 'rising',
+                             np.where(relative < -TREND_THRESHOLD, 'falling', 'flat'))
+            result = pd.DataFrame({'mean': mean, 'slope': slope,
+                                   'pct_per_month': relative * 100, 'trend': trend},
+                                  index=window.columns)
+            return result[result['mean'] > 0].sort_values('slope', ascending=False)
+        return self._cached(('trends', months), compute)
+
+# ========================
+# MAIN EXECUTION
+# ========================
+
+def main(argv=None):
+    from storage import open_store
+
+    parser = argparse.ArgumentParser(description="Spending trends from a user data store")
+    parser.add_argument('path', nargs='?', default='user_data.json')
+    parser.add_argument('--months', type=int, default=6, help="Months of history to show")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    analytics = SpendingAnalytics(open_store(args.path))
+    mom = analytics.month_over_month(args.months)
+    trends = analytics.category_trends(args.months)
+    elapsed = (time.perf_counter() - start) * 1000
+
+    print("Month        Total         Change")
+    for period, row in mom.iterrows():
+        change = "" if np.isnan(row['pct_change']) else f"{row['pct_change']:+.1f}%"
+        print(f"  {str(period):10s} ₹{row['total']:>12,.2f}  {change}")
+    print("\nCategory trends:")
+    for category, row in trends.iterrows():
+        print(f"  {category:15s} {row['trend']:8s} {row['pct_per_month']:+.1f}%/month")
+    print(f"\nComputed in {elapsed:.1f} ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,395 @@
+"""
+SPENDING ANOMALIES
+Streaming per-category statistics that flag unusual expenses as they are
+added, in constant time and space per category
+"""
+
+import argparse
+import json
+import math
+import os
+import time
+from collections import deque
+from datetime import date, timedelta
+
+# Statistics across all categories, used for categories with little history
+ALL_CATEGORIES = '*'
+
+STATE_VERSION = 1
+
+class RunningStats:
+    """Welford's running mean and variance"""
+
+    def __init__(self, n=0, mean=0.0, m2=0.0):
+        self.n = n
+        self.mean = mean
+        self.m2 = m2
+
+    def add(self, x):
+        self.n += 1
+        delta = x - self.mean
+        self.mean += delta / self.n
+        self.m2 += delta * (x - self.mean)
+
+    def remove(self, x):
+        """Exactly undo an earlier add(x)"""
+        if self.n <= 1:
+            self.n, self.mean, self.m2 = 0, 0.0, 0.0
+            return
+        mean = (self.n * self.mean - x) / (self.n - 1)
+        self.m2 = max(self.m2 - (x - mean) * (x - self.mean), 0.0)
+        self.mean = mean
+        self.n -= 1
+
+    @property
+    def std(self):
+        return math.sqrt(self.m2 / (self.n - 1)) if self.n > 1 else 0.0
+
+    def to_state(self):
+        return [self.n, self.mean, self.m2]
+
+class EWMA:
+    """Exponentially weighted mean and variance, tracking recent behaviour"""
+
+    def __init__(self, alpha, mean=None, var=0.0):
+        self.alpha = alpha
+        self.mean = mean
+        self.var = var
+
+    def add(self, x):
+        if self.mean is None:
+            self.mean = x
+            return
+        delta = x - self.mean
+        increment = self.alpha * delta
+        self.mean += increment
+        self.var = (1 - self.alpha) * (self.var + delta * increment)
+
+    @property
+    def std(self):
+        return math.sqrt(self.var)
+
+    def to_state(self):
+        return [self.mean, self.var]
+
+class P2Quantile:
+    """Streaming estimate of one quantile with the P² algorithm
+
+    Keeps five markers (heights and positions) instead of the samples,
+    adjusting the middle ones with piecewise-parabolic interpolation as
+    values arrive (Jain & Chlamtac, 1985).
+    """
+
+    def __init__(self, p, heights=None, positions=None, desired=None):
+        self.p = p
+        self.heights = heights if heights is not None else []
+        self.positions = positions if positions is not None else [1, 2, 3, 4, 5]
+        self.desired = desired if desired is not None else [1, 1 + 2 * p, 1 + 4 * p, 3 + 2 * p, 5]
+        self._increments = [0, p / 2, p, (1 + p) / 2, 1]
+
+    def add(self, x):
+        q, n = self.heights, self.positions
+        if len(q) < 5:
+            q.append(x)
+            q.sort()
+            return
+
+        if x < q[0]:
+            q[0] = x
+            k = 0
+        elif x >= q[4]:
+            q[4] = x
+            k = 3
+        else:
+            k = next(i for i in range(1, 5) if x < q[i]) - 1
+        for i in range(k + 1, 5):
+            n[i] += 1
+        for i in range(5):
+            self.desired[i] += self._increments[i]
+
+        for i in range(1, 4):
+            d = self.desired[i] - n[i]
+            if (d >= 1 and n[i + 1] - n[i] > 1) or (d <= -1 and n[i - 1] - n[i] < -1):
+                d = 1 if d > 0 else -1
+                height = q[i] + d / (n[i + 1] - n[i - 1]) * (
+                    (n[i] - n[i - 1] + d) * (q[i + 1] - q[i]) / (n[i + 1] - n[i])
+                    + (n[i + 1] - n[i] - d) * (q[i] - q[i - 1]) / (n[i] - n[i - 1]))
+                if not q[i - 1] < height < q[i + 1]:
+                    height = q[i] + d * (q[i + d] - q[i]) / (n[i + d] - n[i])
+                q[i] = height
+                n[i] += d
+
+    @property
+    def value(self):
+        if len(self.heights) < 5:
+            if not self.heights:
+                return math.nan
+            return self.heights[round(self.p * (len(self.heights) - 1))]
+        return self.heights[2]
+
+    def to_state(self):
+        return [self.heights, self.positions, self.desired]
+
+class CategoryStats:
+    """Running statistics of one category's expenses
+
+    ``log_amounts`` (Welford) and ``recent`` (EWMA) are over log amounts,
+    since spending is heavy-tailed. ``high`` estimates a high quantile of
+    raw amounts. ``daily`` is an EWMA of the category's total on days it
+    has spending, against which the running total of ``day`` is compared.
+    """
+
+    def __init__(self, quantile, alpha, state=None):
+        state = state or {}
+        self.log_amounts = RunningStats(*state.get('log_amounts', ()))
+        self.recent = EWMA(alpha, *state.get('recent', ()))
+        self.high = P2Quantile(quantile, *state.get('high', ()))
+        self.daily = EWMA(alpha, *state.get('daily', ()))
+        self.active_days = state.get('active_days', 0)
+        self.day = state.get('day')
+        self.day_total = state.get('day_total', 0.0)
+
+    def add(self, day, amount):
+        log_amount = math.log1p(max(amount, 0))
+        self.log_amounts.add(log_amount)
+        self.recent.add(log_amount)
+        self.high.add(amount)
+        if day != self.day:
+            # Expenses mostly arrive in date order; a late one starts a new day
+            if self.day is not None:
+                self.daily.add(self.day_total)
+            self.day = day
+            self.day_total = 0.0
+            self.active_days += 1
+        self.day_total += amount
+
+    def to_state(self):
+        return {
+            'log_amounts': self.log_amounts.to_state(),
+            'recent': self.recent.to_state(),
+            'high': self.high.to_state(),
+            'daily': self.daily.to_state(),
+            'active_days': self.active_days,
+            'day': self.day,
+            'day_total': self.day_total
+        }
+
+class AnomalyDetector:
+    """Flags unusual expenses from per-category streaming statistics
+
+    An expense is unusual when its log amount is ``z_threshold`` standard
+    deviations above both the category's long-run mean and its recent
+    (EWMA) mean, and above the category's ``quantile`` estimate.
+    Categories with fewer than ``min_samples`` expenses are judged against
+    all spending. A spike is a category's total for the day exceeding
+    ``spike_factor`` times its usual daily total.
+
+    Scoring and updating are O(1) per expense. The state is a few numbers
+    per category; ``sync`` folds in whatever expenses were added since
+    ``seen``, so the saved state resumes after restarts and imports. It is
+    saved to ``path`` every ``checkpoint_every`` expenses.
+
+    ``move`` applies a category correction to the Welford statistics
+    exactly. The EWMA, quantile and daily statistics can't take an expense
+    back, so they are marked ``stale`` until ``rebuild`` replays the
+    history (the assistant does so on exit, or run the ``rebuild`` command).
+    """
+
+    def __init__(self, path=None, z_threshold=3.0, quantile=0.95, alpha=0.1,
+                 spike_factor=3.0, min_samples=10, max_flags=20, checkpoint_every=20):
+        self.path = path
+        self.checkpoint_every = checkpoint_every
+        self.z_threshold = z_threshold
+        self.quantile = quantile
+        self.alpha = alpha
+        self.spike_factor = spike_factor
+        self.min_samples = min_samples
+        self.categories = {}
+        self.flags = deque(maxlen=max_flags)
+        self.seen = 0
+        self.pending_updates = 0
+        self.stale = False
+
+    def _stats(self, category):
+        stats = self.categories.get(category)
+        if stats is None:
+            stats = self.categories[category] = CategoryStats(self.quantile, self.alpha)
+        return stats
+
+    def score(self, expense):
+        """A flag dict if ``expense`` is unusual given the history so far, else None"""
+        amount, category = expense['amount'], expense['category']
+        stats = self.categories.get(category)
+        baseline = stats
+        if baseline is None or baseline.log_amounts.n < self.min_samples:
+            baseline = self.categories.get(ALL_CATEGORIES)
+        reasons = []
+        z = 0.0
+
+        if baseline is not None and baseline.log_amounts.n >= self.min_samples:
+            log_amount = math.log1p(max(amount, 0))
+            std = baseline.log_amounts.std
+            if std > 0:
+                z = (log_amount - baseline.log_amounts.mean) / std
+            recent_z = ((log_amount - baseline.recent.mean) / baseline.recent.std
+                        if baseline.recent.std > 0 else z)
+            if (z >= self.z_threshold and recent_z >= self.z_threshold
+                    and amount > baseline.high.value):
+                typical = math.expm1(baseline.log_amounts.mean)
+                usual = f"a usual {category} expense" if baseline is stats else "your usual expense"
+                reasons.append(f"₹{amount:,.0f} is far above {usual} (₹{typical:,.0f})")
+
+        if stats is not None and stats.active_days >= self.min_samples and stats.daily.mean:
+            day_total = amount + (stats.day_total if stats.day == expense['date'] else 0.0)
+            if day_total > self.spike_factor * stats.daily.mean:
+                reasons.append(f"{category} spending today (₹{day_total:,.0f}) is "
+                               f"{day_total / stats.daily.mean:.1f}x a usual day")
+                z = max(z, day_total / stats.daily.mean)
+
+        if not reasons:
+            return None
+        return {
+            'date': expense['date'],
+            'transaction': expense['transaction'],
+            'amount': amount,
+            'category': category,
+            'score': round(z, 2),
+            'reasons': reasons
+        }
+
+    def update(self, expense):
+        """Fold an expense into its category's and the overall statistics"""
+        self._stats(expense['category']).add(expense['date'], expense['amount'])
+        self._stats(ALL_CATEGORIES).add(expense['date'], expense['amount'])
+
+    def observe(self, expense):
+        """Score an expense, then learn from it; returns the flag or None"""
+        flag = self.score(expense)
+        if flag is not None:
+            self.flags.append(flag)
+        self.update(expense)
+        self.seen += 1
+        self.pending_updates += 1
+        return flag
+
+    def sync(self, expenses):
+        """Observe expenses added since the last call; returns the new flags
+
+        A history shorter than what was seen (data replaced) is rebuilt.
+        """
+        if len(expenses) < self.seen:
+            self.reset()
+        flags = [self.observe(expense) for expense in expenses[self.seen:]]
+        if self.path and self.checkpoint_every and self.pending_updates >= self.checkpoint_every:
+            self.checkpoint()
+        return [flag for flag in flags if flag is not None]
+
+    def reset(self):
+        self.categories.clear()
+        self.flags.clear()
+        self.seen = 0
+        self.stale = False
+
+    def move(self, index, expense, category):
+        """Apply a correction of the stored expense at ``index`` to ``category``
+
+        ``expense`` is the expense as it was observed, with its old category.
+        """
+        if index >= self.seen or expense['category'] == category:
+            # Not observed yet: sync will see the corrected category
+            return
+        log_amount = math.log1p(max(expense['amount'], 0))
+        old = self.categories.get(expense['category'])
+        if old is not None:
+            old.log_amounts.remove(log_amount)
+        self._stats(category).log_amounts.add(log_amount)
+        self.stale = True
+        self.pending_updates += 1
+
+    def rebuild(self, expenses):
+        """Replay the whole history, bringing every statistic up to date"""
+        self.reset()
+        self.sync(expenses)
+
+    def recent_flags(self, days=7):
+        """Flags of expenses dated within the last ``days`` days, newest first"""
+        since = (date.today() - timedelta(days=days - 1)).isoformat()
+        return [flag for flag in reversed(self.flags) if flag['date'] >= since]
+
+    def to_state(self):
+        return {
+            'version': STATE_VERSION,
+            'seen': self.seen,
+            'stale': self.stale,
+            'categories': {name: stats.to_state() for name, stats in self.categories.items()},
+            'flags': list(self.flags)
+        }
+
+    def checkpoint(self):
+        """Atomically write the state to ``path``"""
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(json.dumps(self.to_state(), ensure_ascii=False))
+        os.replace(tmp_path, self.path)
+        self.pending_updates = 0
+
+    @classmethod
+    def load_or_build(cls, path, expenses, **kwargs):
+        """Resume from the saved state and catch up with ``expenses``
+
+        Without a usable state file the statistics are rebuilt from the
+        whole history.
+        """
+        detector = cls(path, **kwargs)
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+            if state.get('version') == STATE_VERSION:
+                detector.seen = state['seen']
+                detector.stale = state.get('stale', False)
+                detector.categories = {
+                    name: CategoryStats(detector.quantile, detector.alpha, stats)
+                    for name, stats in state['categories'].items()}
+                detector.flags.extend(state['flags'])
+        detector.sync(expenses)
+        return detector
+
+def state_path_for(data_path):
+    """Where the detector state for a user data file is kept"""
+    return os.path.splitext(data_path)[0] + '.anomaly.json'
+
+# ========================
+# MAIN EXECUTION
+# ========================
+
+def main(argv=None):
+    from storage import open_store
+
+    parser = argparse.ArgumentParser(description="Spending anomaly detection")
+    parser.add_argument('command', choices=['rebuild', 'flags'],
+                        help="Rebuild the state from history, or list recent flags")
+    parser.add_argument('--data', default='user_data.json')
+    parser.add_argument('--days', type=int, default=30, help="Days of flags to list")
+    args = parser.parse_args(argv)
+
+    expenses = open_store(args.data).data['expenses']
+    path = state_path_for(args.data)
+    start = time.perf_counter()
+    if args.command == 'rebuild':
+        detector = AnomalyDetector(path, checkpoint_every=0)
+        detector.sync(expenses)
+    else:
+        detector = AnomalyDetector.load_or_build(path, expenses, checkpoint_every=0)
+    detector.checkpoint()
+    elapsed = time.perf_counter() - start
+    categories = len(set(detector.categories) - {ALL_CATEGORIES})
+    print(f"✓ {detector.seen:,} expenses in {categories} categories, "
+          f"{elapsed:.1f}s")
+    if detector.stale:
+        print("  Corrections are pending in the recent-spending statistics; run 'rebuild'")
+    for flag in detector.recent_flags(args.days):
+        print(f"  🚨 {flag['date']} {flag['transaction']} ({flag['category']}): "
+              f"{'; '.join(flag['reasons'])}")
+
+if __name__ == "__main__":
+    main()
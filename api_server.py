@@ -0,0 +1,282 @@
+"""
+CATEGORIZATION API
+Stdlib asyncio HTTP service that coalesces concurrent single-transaction
+requests into micro-batches scored with one predict_batch call
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+
+from predict import HotReloadingPredictor
+
+logger = logging.getLogger(__name__)
+
+MAX_BODY_BYTES = 1 << 20
+
+class QueueFullError(Exception):
+    """Raised when the batcher queue is full and the request is shed"""
+
+# ========================
+# 1. MICRO-BATCHING
+# ========================
+
+class MicroBatcher:
+    """Coalesces concurrent predictions into batches
+
+    A batch is flushed when it reaches ``max_batch_size`` or when
+    ``max_delay`` seconds have passed since its first request. While one
+    batch is being scored in a worker thread the next one keeps filling,
+    so batches grow with load. The queue is bounded: once ``max_queue``
+    requests are waiting, new ones are rejected instead of piling up.
+    """
+
+    def __init__(self, predictor, max_batch_size=64, max_delay=0.0005, max_queue=1024):
+        self.predictor = predictor
+        self.max_batch_size = max_batch_size
+        self.max_delay = max_delay
+        self.queue = asyncio.Queue(maxsize=max_queue)
+        self.requests = 0
+        self.rejected = 0
+        self.batches = 0
+        self.max_queue_depth = 0
+        # Power-of-two buckets: {1: n, 2: n, 4: n, ...} keyed by upper bound
+        self.batch_size_histogram = {}
+        self._task = None
+
+    def start(self):
+        self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    async def predict(self, transaction):
+        """Queue one transaction and wait for its batch to be scored"""
+        future = asyncio.get_running_loop().create_future()
+        try:
+            self.queue.put_nowait((transaction, future))
+        except asyncio.QueueFull:
+            self.rejected += 1
+            raise QueueFullError()
+        self.requests += 1
+        self.max_queue_depth = max(self.max_queue_depth, self.queue.qsize())
+        return await future
+
+    async def _collect(self):
+        """Wait for a first request, then fill the batch until size or deadline"""
+        loop = asyncio.get_running_loop()
+        batch = [await self.queue.get()]
+        deadline = loop.time() + self.max_delay
+        while len(batch) < self.max_batch_size:
+            try:
+                batch.append(self.queue.get_nowait())
+                continue
+            except asyncio.QueueEmpty:
+                pass
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._collect()
+            self._record_batch(len(batch))
+            transactions = [transaction for transaction, _ in batch]
+            try:
+                results = await loop.run_in_executor(None, self.predictor.predict_batch, transactions)
+            except Exception as e:
+                logger.exception("Batch of %d failed", len(batch))
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            for (_, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+
+    def _record_batch(self, size):
+        self.batches += 1
+        bucket = 1
+        while bucket < size:
+            bucket *= 2
+        self.batch_size_histogram[bucket] = self.batch_size_histogram.get(bucket, 0) + 1
+
+    def metrics(self):
+        return {
+            'queue_depth': self.queue.qsize(),
+            'max_queue_depth': self.max_queue_depth,
+            'queue_capacity': self.queue.maxsize,
+            'requests': self.requests,
+            'rejected': self.rejected,
+            'batches': self.batches,
+            'mean_batch_size': self.requests / self.batches if self.batches else 0.0,
+            'batch_size_histogram': {f"<={size}": count for size, count
+                                     in sorted(self.batch_size_histogram.items())}
+        }
+
+# ========================
+# 2. HTTP HANDLING
+# ========================
+
+REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 413: 'Payload Too Large',
+           503: 'Service Unavailable'}
+
+class CategorizationServer:
+    """Minimal HTTP/1.1 server with keep-alive around the batcher
+
+    Routes:
+        POST /categorize        {"transaction": "..."}
+        POST /categorize/batch  {"transactions": ["...", ...]}
+        GET  /metrics
+        GET  /health
+    """
+
+    def __init__(self, predictor, **batcher_options):
+        self.predictor = predictor
+        self.batcher_options = batcher_options
+        self.batcher = None
+
+    async def serve(self, host='127.0.0.1', port=8000):
+        self.batcher = MicroBatcher(self.predictor, **self.batcher_options)
+        self.batcher.start()
+        server = await asyncio.start_server(self._handle_connection, host, port)
+        print(f"✓ Categorization API listening on http://{host}:{port}")
+        async with server:
+            await server.serve_forever()
+
+    async def _handle_connection(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                try:
+                    method, path, _ = request_line.decode('latin-1').split(' ', 2)
+                except ValueError:
+                    await self._respond(writer, 400, {'error': 'Malformed request line'}, False)
+                    break
+
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+
+                try:
+                    length = int(headers.get('content-length', 0) or 0)
+                except ValueError:
+                    length = -1
+                if length < 0:
+                    # The body can't be framed, so the connection can't be reused
+                    await self._respond(writer, 400, {'error': 'Invalid Content-Length'}, False)
+                    break
+                keep_alive = headers.get('connection', '').lower() != 'close'
+                if length > MAX_BODY_BYTES:
+                    await self._respond(writer, 413, {'error': 'Body too large'}, False)
+                    break
+                body = await reader.readexactly(length) if length else b''
+
+                status, payload = await self._route(method, path, body)
+                await self._respond(writer, status, payload, keep_alive)
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def _route(self, method, path, body):
+        if method == 'GET' and path == '/health':
+            return 200, {'status': 'ok', 'model_version': self.predictor.version}
+        if method == 'GET' and path == '/metrics':
+            return 200, self._metrics()
+        if method != 'POST' or path not in ('/categorize', '/categorize/batch'):
+            return 404, {'error': f'No route for {method} {path}'}
+
+        try:
+            data = json.loads(body or b'{}')
+        except ValueError:
+            return 400, {'error': 'Body must be JSON'}
+        if not isinstance(data, dict):
+            return 400, {'error': 'Body must be a JSON object'}
+
+        if path == '/categorize/batch':
+            transactions = data.get('transactions')
+            if not isinstance(transactions, list) or not all(isinstance(t, str) for t in transactions):
+                return 400, {'error': "'transactions' must be a list of strings"}
+            loop = asyncio.get_running_loop()
+            results = await loop.run_in_executor(None, self.predictor.predict_batch, transactions)
+            return 200, {'results': results}
+
+        transaction = data.get('transaction')
+        if not isinstance(transaction, str) or not transaction.strip():
+            return 400, {'error': "'transaction' must be a non-empty string"}
+        try:
+            return 200, await self.batcher.predict(transaction)
+        except QueueFullError:
+            return 503, {'error': 'Server busy, retry later'}
+
+    def _metrics(self):
+        """Batcher metrics plus the counters of the currently served predictor"""
+        predictor = self.predictor.predictor
+        metrics = self.batcher.metrics()
+        metrics['model_version'] = self.predictor.version
+        metrics['cache'] = predictor.cache.stats()
+        metrics['merchant_index'] = (predictor.merchant_index.stats()
+                                     if predictor.merchant_index is not None else None)
+        metrics['corrections'] = (predictor.corrections.stats()
+                                  if predictor.corrections is not None else None)
+        return metrics
+
+    async def _respond(self, writer, status, payload, keep_alive):
+        body = json.dumps(payload).encode('utf-8')
+        head = (f"HTTP/1.1 {status} {REASONS[status]}\r\n"
+                f"Content-Type: application/json\r\n"
+                f"Content-Length: {len(body)}\r\n"
+                f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n"
+                + ("Retry-After: 1\r\n" if status == 503 else "")
+                + "\r\n")
+        writer.write(head.encode('latin-1') + body)
+        await writer.drain()
+
+# ========================
+# MAIN EXECUTION
+# ========================
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Expense categorization API")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--max-batch-size', type=int, default=64)
+    parser.add_argument('--max-delay-ms', type=float, default=0.5)
+    parser.add_argument('--max-queue', type=int, default=1024)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.WARNING)
+    server = CategorizationServer(
+        HotReloadingPredictor(),
+        max_batch_size=args.max_batch_size,
+        max_delay=args.max_delay_ms / 1000,
+        max_queue=args.max_queue
+    )
+    try:
+        asyncio.run(server.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        print("\nGoodbye! 👋")
+
+if __name__ == "__main__":
+    main()
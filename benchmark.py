@@ -0,0 +1,197 @@
+"""
+BENCHMARKS
+Timing harness for the categorizer hot paths with JSON output and
+regression checks against a stored baseline
+"""
+
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+from predict import ExpensePredictor
+from train_model import create_sample_dataset
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# Metric name suffix -> True when a larger value is better
+HIGHER_IS_BETTER = {
+    'rows_per_sec': True,
+    '_ms': False,
+    '_us': False,
+    '_mb': False
+}
+
+# ========================
+# 1. SYNTHETIC DATA
+# ========================
+
+def synthetic_transactions(n, seed=42):
+    """Realistic-looking transactions built from the sample dataset"""
+    rng = random.Random(seed)
+    base = [t.rsplit(' ', 1)[0] for t in create_sample_dataset()['transaction']]
+    extras = ['', '', 'payment', 'order', 'bill', 'upi', 'online', 'monthly', 'ref']
+    return [f"{rng.choice(base)} {rng.choice(extras)} {rng.randint(10, 50000)}".replace('  ', ' ')
+            for _ in range(n)]
+
+# ========================
+# 2. MEASUREMENTS
+# ========================
+
+def _run_child(code):
+    """Run Python code in a fresh interpreter and parse the JSON it prints"""
+    output = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True,
+                            check=True, cwd=os.getcwd(),
+                            env=dict(os.environ, PYTHONPATH=HERE, PYTHONWARNINGS='ignore'))
+    return json.loads(output.stdout.strip().splitlines()[-1])
+
+def bench_cold_load(model_path, runs=5):
+    """ExpensePredictor construction in a fresh process, imports included"""
+    if model_path.endswith('.bin'):
+        setup = "from compact_model import CompactExpensePredictor as Loader"
+    else:
+        setup = "from predict import ExpensePredictor as Loader"
+    code = (
+        "import json, time\n"
+        "start = time.perf_counter()\n"
+        f"{setup}\n"
+        f"Loader({model_path!r}, merchant_index_path=None)\n"
+        "print(json.dumps((time.perf_counter() - start) * 1000))"
+    )
+    times = [_run_child(code) for _ in range(runs)]
+    return float(np.median(times))
+
+def bench_single_latency(predictor, transactions):
+    """Per-call predict_category latency percentiles in microseconds"""
+    timings = []
+    for transaction in transactions:
+        start = time.perf_counter()
+        predictor.predict_category(transaction)
+        timings.append((time.perf_counter() - start) * 1e6)
+    p50, p95, p99 = np.percentile(timings, [50, 95, 99])
+    return {'predict_p50_us': p50, 'predict_p95_us': p95, 'predict_p99_us': p99}
+
+def bench_batch(predictor, transactions):
+    """predict_batch throughput"""
+    start = time.perf_counter()
+    predictor.predict_batch(transactions)
+    return len(transactions) / (time.perf_counter() - start)
+
+def bench_preprocess(predictor, transactions):
+    """preprocess throughput"""
+    start = time.perf_counter()
+    for transaction in transactions:
+        predictor.preprocess(transaction)
+    return len(transactions) / (time.perf_counter() - start)
+
+def bench_training():
+    """Training wall time (best of 5) and peak RSS in a fresh process"""
+    code = (
+        "import json, resource, time\n"
+        "from train_model import ExpenseCategorizer, create_sample_dataset, preprocess_series\n"
+        "df = create_sample_dataset()\n"
+        "elapsed = float('inf')\n"
+        "for _ in range(5):\n"
+        "    start = time.perf_counter()\n"
+        "    ExpenseCategorizer().train(preprocess_series(df['transaction']), df['category'])\n"
+        "    elapsed = min(elapsed, (time.perf_counter() - start) * 1000)\n"
+        "print(json.dumps([elapsed, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss]))"
+    )
+    elapsed, peak = _run_child(code)
+    peak_mb = peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+    return {'train_wall_ms': elapsed, 'train_peak_rss_mb': peak_mb}
+
+def run_benchmarks(model_path='expense_categorizer.pkl', sizes=(1000, 100000, 1000000),
+                   latency_samples=2000):
+    """Run every benchmark and return a flat {metric: value} dict"""
+    results = {'cold_load_pickle_ms': bench_cold_load(model_path)}
+    compact_path = os.path.splitext(model_path)[0] + '.bin'
+    if os.path.exists(compact_path):
+        results['cold_load_compact_ms'] = bench_cold_load(compact_path)
+
+    # Cache and merchant index off, so every call exercises the model
+    predictor = ExpensePredictor(model_path, cache_size=0, merchant_index_path=None)
+    results.update(bench_single_latency(predictor, synthetic_transactions(latency_samples, seed=1)))
+
+    for size in sizes:
+        transactions = synthetic_transactions(size, seed=size)
+        results[f'preprocess_{size}_rows_per_sec'] = bench_preprocess(predictor, transactions)
+        results[f'batch_{size}_rows_per_sec'] = bench_batch(predictor, transactions)
+
+    results.update(bench_training())
+    return {name: float(value) for name, value in results.items()}
+
+# ========================
+# 3. BASELINE COMPARISON
+# ========================
+
+def compare(results, baseline, tolerance=0.10):
+    """Metrics that got worse than the baseline by more than ``tolerance``"""
+    regressions = []
+    for name, value in results.items():
+        old = baseline.get(name)
+        if not old:
+            continue
+        higher_is_better = next((better for suffix, better in HIGHER_IS_BETTER.items()
+                                 if name.endswith(suffix)), False)
+        change = (value - old) / old
+        if (higher_is_better and change < -tolerance) or (not higher_is_better and change > tolerance):
+            regressions.append((name, old, value, change))
+    return regressions
+
+# ========================
+# MAIN EXECUTION
+# ========================
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the expense categorizer")
+    parser.add_argument('--model', default='expense_categorizer.pkl')
+    parser.add_argument('--sizes', default='1000,100000,1000000',
+                        help="Comma-separated predict_batch row counts")
+    parser.add_argument('--output', default='bench_results.json')
+    parser.add_argument('--baseline', default='bench_baseline.json')
+    parser.add_argument('--save-baseline', action='store_true',
+                        help="Store these results as the new baseline")
+    parser.add_argument('--tolerance', type=float, default=0.10)
+    args = parser.parse_args(argv)
+
+    sizes = [int(size) for size in args.sizes.split(',')]
+    results = run_benchmarks(args.model, sizes)
+
+    print("\n{:<36} {:>16}".format("Metric", "Value"))
+    print("-" * 53)
+    for name, value in results.items():
+        print("{:<36} {:>16,.2f}".format(name, value))
+
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"\nResults saved as {args.output}")
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Baseline saved as {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print("No baseline to compare against (use --save-baseline)")
+        return 0
+
+    with open(args.baseline, 'r') as f:
+        regressions = compare(results, json.load(f), args.tolerance)
+    if not regressions:
+        print(f"✓ No regressions beyond {args.tolerance * 100:.0f}% of baseline")
+        return 0
+
+    print(f"\n✗ {len(regressions)} regression(s) beyond {args.tolerance * 100:.0f}% of baseline:")
+    for name, old, new, change in regressions:
+        print(f"  {name}: {old:,.2f} -> {new:,.2f} ({change * 100:+.1f}%)")
+    return 1
+
+if __name__ == "__main__":
+    sys.exit(main())
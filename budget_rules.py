@@ -0,0 +1,243 @@
+"""
+BUDGET RULES
+Declarative spending rules behind the assistant's suggestions, compiled
+once and re-evaluated only when the spending they read changes
+"""
+
+import argparse
+import json
+import operator
+import os
+import time
+from datetime import date, timedelta
+
+DEFAULT_RULES_PATH = 'budget_rules.json'
+DEFAULT_WINDOW_DAYS = 30
+
+# Metric for spending across all categories
+TOTAL = 'total'
+
+# A rule fires when all of its ``when`` conditions hold over the trailing
+# ``window_days``. A condition compares a category's spending ("total" for
+# all spending) with a number or with another category's spending times a
+# factor. ``message`` may name metrics as format fields: "{Food}".
+DEFAULT_RULES = [
+    {
+        'id': 'food_budget',
+        'type': 'expense',
+        'category': 'Food',
+        'when': [{'category': 'Food', 'above': 8000}],
+        'message': "💰 You spent ₹{Food} on food this month. Consider meal prep to save money!",
+        'action': 'Learn cooking basics or use budget meal planning'
+    },
+    {
+        'id': 'education_investment',
+        'type': 'learning',
+        'category': 'Education',
+        'when': [{'category': 'Education', 'above': 5000}],
+        'message': "📚 You invested ₹{Education} in education! Create a study plan to maximize your learning.",
+        'action': 'Use the AI Study Plan Agent to structure your learning'
+    },
+    {
+        'id': 'entertainment_vs_education',
+        'type': 'balance',
+        'when': [
+            {'category': 'Entertainment', 'above': {'category': 'Education', 'times': 2}},
+            {'category': 'Education', 'above': 0}
+        ],
+        'message': "⚖️ Entertainment (₹{Entertainment}) > Education (₹{Education}). Consider balancing your investments!",
+        'action': 'Redirect some entertainment budget to skill development'
+    }
+]
+
+_COMPARISONS = {'above': operator.gt, 'below': operator.lt}
+_RULE_KEYS = {'id', 'type', 'category', 'when', 'window_days', 'message', 'action'}
+
+class _Spent(dict):
+    """Metric values for message formatting; unspent categories read as 0"""
+
+    def __missing__(self, key):
+        return 0
+
+class CompiledRule:
+    """A validated rule with its conditions turned into comparisons"""
+
+    def __init__(self, rule):
+        rule_id = rule.get('id')
+        if not rule_id:
+            raise ValueError(f"Budget rule without an id: {rule}")
+        unknown = set(rule) - _RULE_KEYS
+        if unknown:
+            raise ValueError(f"Rule {rule_id!r}: unknown fields {sorted(unknown)}")
+        if not rule.get('when') or not rule.get('message'):
+            raise ValueError(f"Rule {rule_id!r} needs 'when' conditions and a 'message'")
+
+        self.id = rule_id
+        self.window_days = int(rule.get('window_days', DEFAULT_WINDOW_DAYS))
+        if self.window_days < 1:
+            raise ValueError(f"Rule {rule_id!r}: window_days must be at least 1")
+        self.message = rule['message']
+        self.suggestion = {'type': rule.get('type', 'expense')}
+        if 'category' in rule:
+            self.suggestion['category'] = rule['category']
+        self.suggestion['action'] = rule.get('action', '')
+
+        # (metric, comparison, other metric or None, factor or constant)
+        self.checks = []
+        self.metrics = set()
+        for condition in rule['when']:
+            self.checks.append(self._compile_condition(condition))
+        try:
+            # Fail now rather than when the rule first fires
+            self.message.format_map(_Spent())
+        except (KeyError, IndexError, ValueError) as e:
+            raise ValueError(f"Rule {rule_id!r}: bad message template: {e}") from e
+
+    def _compile_condition(self, condition):
+        comparisons = [key for key in condition if key in _COMPARISONS]
+        if 'category' not in condition or len(comparisons) != 1 or len(condition) != 2:
+            raise ValueError(f"Rule {self.id!r}: a condition needs 'category' and one of "
+                             f"{sorted(_COMPARISONS)}, got {condition}")
+        metric = condition['category']
+        bound = condition[comparisons[0]]
+        self.metrics.add(metric)
+        if isinstance(bound, dict):
+            if 'category' not in bound or set(bound) - {'category', 'times'}:
+                raise ValueError(f"Rule {self.id!r}: a relative bound needs 'category' "
+                                 f"and optionally 'times', got {bound}")
+            self.metrics.add(bound['category'])
+            return metric, _COMPARISONS[comparisons[0]], bound['category'], float(bound.get('times', 1))
+        return metric, _COMPARISONS[comparisons[0]], None, float(bound)
+
+    def evaluate(self, totals):
+        """The suggestion dict if the rule fires over ``totals``, else None"""
+        for metric, compare, other, value in self.checks:
+            if other is not None:
+                value *= totals.get(other, 0)
+            if not compare(totals.get(metric, 0), value):
+                return None
+        suggestion = dict(self.suggestion)
+        suggestion['message'] = self.message.format_map(_Spent(totals))
+        return suggestion
+
+def load_rules(path=DEFAULT_RULES_PATH):
+    """Rules from a JSON list in ``path``, or the defaults if there is no such file"""
+    if not os.path.exists(path):
+        return DEFAULT_RULES
+    with open(path, 'r', encoding='utf-8') as f:
+        rules = json.load(f)
+    if not isinstance(rules, list):
+        raise ValueError(f"{path} should hold a JSON list of rules")
+    return rules
+
+class BudgetRuleEngine:
+    """Suggestions from budget rules, kept current as expenses arrive
+
+    Rules are compiled once and indexed by the (window, category) totals
+    they read. The engine subscribes to the store: a change dated inside a
+    rule window marks that window stale, and on the next read the window's
+    totals are re-read from the store's day rollup. Only rules reading a
+    total that actually changed are re-evaluated, and the suggestion list
+    is cached until one of them changes its outcome. Windows also go stale
+    when the date changes, since they trail today.
+    """
+
+    def __init__(self, store, rules=None):
+        self.store = store
+        self.rules = [CompiledRule(rule) for rule in (DEFAULT_RULES if rules is None else rules)]
+        ids = [rule.id for rule in self.rules]
+        if len(set(ids)) != len(ids):
+            raise ValueError("Budget rule ids must be unique")
+
+        self._rules_by_window = {}
+        self._rules_by_metric = {}
+        for i, rule in enumerate(self.rules):
+            self._rules_by_window.setdefault(rule.window_days, []).append(i)
+            for metric in rule.metrics:
+                self._rules_by_metric.setdefault((rule.window_days, metric), []).append(i)
+
+        self._totals = {}
+        self._fired = [None] * len(self.rules)
+        self._suggestions = None
+        self._today = None
+        self._stale = set(self._rules_by_window)
+        store.subscribe(self._on_change)
+
+    def _on_change(self, days):
+        if days is None or self._today is None:
+            self._stale.update(self._rules_by_window)
+            return
+        latest = max(days)
+        for window in self._rules_by_window:
+            since = (self._today - timedelta(days=window - 1)).isoformat()
+            if latest >= since:
+                self._stale.add(window)
+
+    def _refresh_window(self, window):
+        today = self._today.isoformat()
+        since = (self._today - timedelta(days=window - 1)).isoformat()
+        totals = self.store.spending_by_category(since, today)
+        totals[TOTAL] = sum(totals.values())
+
+        previous = self._totals.get(window)
+        self._totals[window] = totals
+        if previous is None:
+            affected = self._rules_by_window[window]
+        else:
+            changed = {metric for metric in previous.keys() | totals.keys()
+                       if previous.get(metric, 0) != totals.get(metric, 0)}
+            affected = {i for metric in changed
+                        for i in self._rules_by_metric.get((window, metric), ())}
+
+        for i in affected:
+            fired = self.rules[i].evaluate(totals)
+            if fired != self._fired[i]:
+                self._fired[i] = fired
+                self._suggestions = None
+
+    def suggestions(self):
+        """Suggestions of the rules that currently fire, in rule order"""
+        today = date.today()
+        if today != self._today:
+            self._today = today
+            self._stale.update(self._rules_by_window)
+        while self._stale:
+            self._refresh_window(self._stale.pop())
+        if self._suggestions is None:
+            self._suggestions = [fired for fired in self._fired if fired is not None]
+        return self._suggestions
+
+# ========================
+# MAIN EXECUTION
+# ========================
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Budget rules for smart suggestions")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    init = subparsers.add_parser('init', help="Write the default rules to a file for editing")
+    init.add_argument('path', nargs='?', default=DEFAULT_RULES_PATH)
+    check = subparsers.add_parser('check', help="Evaluate rules against a user data store")
+    check.add_argument('--rules', default=DEFAULT_RULES_PATH)
+    check.add_argument('--data', default='user_data.json')
+    args = parser.parse_args(argv)
+
+    if args.command == 'init':
+        if os.path.exists(args.path):
+            raise SystemExit(f"✗ {args.path} already exists")
+        with open(args.path, 'w', encoding='utf-8') as f:
+            json.dump(DEFAULT_RULES, f, indent=2, ensure_ascii=False)
+        print(f"✓ Wrote {len(DEFAULT_RULES)} rules to {args.path}")
+        return
+
+    from storage import open_store
+
+    engine = BudgetRuleEngine(open_store(args.data), load_rules(args.rules))
+    start = time.perf_counter()
+    suggestions = engine.suggestions()
+    elapsed = (time.perf_counter() - start) * 1000
+    for suggestion in suggestions:
+        print(f"  • {suggestion['message']}")
+    print(f"{len(engine.rules)} rules evaluated in {elapsed:.2f} ms, {len(suggestions)} fired")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+"""
+BULK CATEGORIZER
+Categorizes large bank statement exports (CSV/JSONL) across a process
+pool and writes the results in the original row order
+"""
+
+import argparse
+import multiprocessing
+import os
+import time
+from collections import deque
+
+import pandas as pd
+
+from predict import load_predictor
+
+# Added to every row. Prefixed so a labeled export's own 'category' column
+# is kept next to the prediction instead of being overwritten.
+OUTPUT_COLUMNS = ['predicted_category', 'predicted_confidence', 'predicted_source']
+
+# ========================
+# 1. WORKERS
+# ========================
+
+# One predictor per worker process, loaded once by _init_worker. The compact
+# artifact is memory-mapped, so workers share its pages.
+_predictor = None
+
+def _init_worker(model_path, compact_path):
+    global _predictor
+    _predictor = load_predictor(model_path, compact_path, verbose=False)
+
+def _categorize_chunk(transactions):
+    """Score one shard; returns parallel category/confidence/source lists"""
+    results = _predictor.predict_batch(transactions)
+    return ([r['category'] for r in results],
+            [round(r['confidence'], 2) for r in results],
+            [r['source'] for r in results])
+
+# ========================
+# 2. STREAMING I/O
+# ========================
+
+def _is_jsonl(path):
+    return path.endswith(('.jsonl', '.json'))
+
+def iter_chunks(path, chunksize):
+    """Yield DataFrame chunks of a CSV or JSONL statement"""
+    if _is_jsonl(path):
+        reader = pd.read_json(path, lines=True, chunksize=chunksize, dtype=False)
+    else:
+        reader = pd.read_csv(path, chunksize=chunksize, dtype=str, keep_default_na=False)
+    with reader:
+        yield from reader
+
+def _write_chunk(chunk, path, first):
+    if _is_jsonl(path):
+        with open(path, 'a' if not first else 'w', encoding='utf-8') as f:
+            chunk.to_json(f, orient='records', lines=True, force_ascii=False)
+    else:
+        chunk.to_csv(path, mode='w' if first else 'a', header=first, index=False)
+
+# ========================
+# 3. PIPELINE
+# ========================
+
+def bulk_categorize(input_path, output_path, text_column='transaction', workers=None,
+                    chunksize=20000, model_path='expense_categorizer.pkl',
+                    compact_path='expense_categorizer.bin'):
+    """Categorize every row of a statement file, preserving row order
+
+    Chunks are fanned out to the pool with at most two in flight per
+    worker, and written as soon as the oldest outstanding chunk finishes,
+    so memory stays bounded however long the input is. The original
+    columns are kept and ``OUTPUT_COLUMNS`` are added; an input without
+    ``text_column`` or that already has an output column is rejected with
+    ValueError.
+    """
+    workers = workers or os.cpu_count()
+    start = time.perf_counter()
+    rows = 0
+    first = True
+
+    def write(chunk, scored):
+        nonlocal rows, first
+        chunk = chunk.copy()
+        for column, values in zip(OUTPUT_COLUMNS, scored):
+            chunk[column] = values
+        _write_chunk(chunk, output_path, first)
+        first = False
+        rows += len(chunk)
+        print(f"  {rows:,} rows ({rows / (time.perf_counter() - start):,.0f} rows/s)")
+
+    def texts_of(chunk):
+        clashes = [column for column in OUTPUT_COLUMNS if column in chunk.columns]
+        if clashes:
+            raise ValueError(f"{input_path} already has column(s) {', '.join(clashes)}")
+        if text_column not in chunk.columns:
+            raise ValueError(f"{input_path} has no {text_column!r} column")
+        return chunk[text_column].astype(str).tolist()
+
+    if workers == 1:
+        _init_worker(model_path, compact_path)
+        for chunk in iter_chunks(input_path, chunksize):
+            write(chunk, _categorize_chunk(texts_of(chunk)))
+    else:
+        with multiprocessing.Pool(workers, initializer=_init_worker,
+                                  initargs=(model_path, compact_path)) as pool:
+            pending = deque()
+            for chunk in iter_chunks(input_path, chunksize):
+                texts = texts_of(chunk)
+                pending.append((chunk, pool.apply_async(_categorize_chunk, (texts,))))
+                if len(pending) >= 2 * workers:
+                    chunk, result = pending.popleft()
+                    write(chunk, result.get())
+            while pending:
+                chunk, result = pending.popleft()
+                write(chunk, result.get())
+
+    if first:
+        # Empty input: still produce an (empty) output file
+        open(output_path, 'w').close()
+
+    elapsed = time.perf_counter() - start
+    return {
+        'rows': rows,
+        'workers': workers,
+        'seconds': elapsed,
+        'rows_per_second': rows / elapsed if elapsed else 0.0
+    }
+
+# ========================
+# MAIN EXECUTION
+# ========================
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Categorize a bank statement export")
+    parser.add_argument('input', help="CSV or JSONL statement")
+    parser.add_argument('output', help="Where to write the categorized rows (CSV or JSONL)")
+    parser.add_argument('--text-column', default='transaction')
+    parser.add_argument('--workers', type=int, default=None, help="Defaults to all cores")
+    parser.add_argument('--chunksize', type=int, default=20000)
+    args = parser.parse_args(argv)
+
+    print("=" * 60)
+    print("BULK CATEGORIZATION")
+    print("=" * 60)
+    try:
+        report = bulk_categorize(args.input, args.output, args.text_column,
+                                 args.workers, args.chunksize)
+    except ValueError as e:
+        raise SystemExit(f"✗ {e}")
+    print(f"\n✓ {report['rows']:,} rows categorized in {report['seconds']:.1f}s "
+          f"with {report['workers']} worker(s): {report['rows_per_second']:,.0f} rows/s")
+    print(f"Output saved as {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+COMPACT FILE
+Binary container shared by the compact model and the expense archive: a
+fixed preamble, a JSON header and 64-byte aligned arrays that are
+memory-mapped on read
+"""
+
+import json
+import os
+import struct
+
+import numpy as np
+
+ALIGNMENT = 64
+
+# Fixed-size preamble: magic (file type), format version, header length
+_PREAMBLE = struct.Struct('<8sII')
+
+def write_compact(path, header, arrays, magic, version):
+    """Write a header and named arrays, tagged with a file type and version"""
+    header = dict(header)
+    header['arrays'] = {}
+
+    # Offsets are relative to the aligned start of the data section
+    offset = 0
+    for name, array in arrays.items():
+        header['arrays'][name] = {
+            'dtype': array.dtype.str,
+            'shape': list(array.shape),
+            'offset': offset
+        }
+        offset += array.nbytes
+        offset += -offset % ALIGNMENT
+
+    header_bytes = json.dumps(header).encode('utf-8')
+    data_start = _PREAMBLE.size + len(header_bytes)
+    data_start += -data_start % ALIGNMENT
+
+    # Written to a temp file and renamed, so existing memory maps keep the
+    # old pages and readers never see a partial file
+    with open(path + '.tmp', 'wb') as f:
+        f.write(_PREAMBLE.pack(magic, version, len(header_bytes)))
+        f.write(header_bytes)
+        for name, array in arrays.items():
+            f.seek(data_start + header['arrays'][name]['offset'])
+            f.write(np.ascontiguousarray(array).tobytes())
+        f.truncate(data_start + offset)
+    os.replace(path + '.tmp', path)
+
+def read_compact(path, magic, version):
+    """Read the header and memory-map the arrays of a file written by write_compact
+
+    Files of another type, or of a newer version than ``version``, are
+    rejected with ValueError.
+    """
+    with open(path, 'rb') as f:
+        file_magic, file_version, header_len = _PREAMBLE.unpack(f.read(_PREAMBLE.size))
+        if file_magic != magic:
+            raise ValueError(f"{path} is not a {magic.decode('ascii')} file")
+        if file_version > version:
+            raise ValueError(f"Unsupported {magic.decode('ascii')} version {file_version}")
+        header = json.loads(f.read(header_len).decode('utf-8'))
+
+    data_start = _PREAMBLE.size + header_len
+    data_start += -data_start % ALIGNMENT
+
+    arrays = {}
+    for name, spec in header['arrays'].items():
+        shape = tuple(spec['shape'])
+        if 0 in shape:
+            arrays[name] = np.zeros(shape, dtype=spec['dtype'])
+            continue
+        arrays[name] = np.memmap(path, dtype=spec['dtype'], mode='r',
+                                 offset=data_start + spec['offset'], shape=shape)
+    return header, arrays
@@ -0,0 +1,323 @@
+"""
+COMPACT MODEL
+Versioned, memory-mappable export of the expense categorizer and a
+NumPy-only predictor that scores from it without importing sklearn,
+optionally pruned and quantized
+"""
+
+import argparse
+import os
+import re
+import time
+
+import numpy as np
+
+from compact_file import read_compact, write_compact
+from predict import ExpensePredictor
+
+MAGIC = b'SLAMODEL'
+FORMAT_VERSION = 3
+
+# ========================
+# 1. EXPORT
+# ========================
+
+def _vectorizer_config(vectorizer):
+    """Extract the TF-IDF settings the NumPy transform reproduces"""
+    params = vectorizer.get_params()
+    if params['analyzer'] != 'word' or params['tokenizer'] or params['preprocessor']:
+        raise ValueError("Only the default word analyzer can be exported")
+    if params['strip_accents'] or params['stop_words'] or params['binary']:
+        raise ValueError("strip_accents, stop_words and binary are not supported")
+    if params['norm'] not in ('l2', None):
+        raise ValueError(f"Unsupported norm: {params['norm']}")
+
+    return {
+        'lowercase': params['lowercase'],
+        'token_pattern': params['token_pattern'],
+        'ngram_range': list(params['ngram_range']),
+        'sublinear_tf': params['sublinear_tf'],
+        'norm': params['norm'],
+        'use_idf': params['use_idf']
+    }
+
+def _proba_mode(model):
+    """How the linear scores are turned into probabilities"""
+    if len(model.classes_) == 2:
+        return 'binary'
+    if type(model).__name__ != 'LogisticRegression':
+        return 'ovr'
+    multi_class = getattr(model, 'multi_class', 'auto')
+    if multi_class == 'ovr' or (multi_class == 'auto' and model.solver == 'liblinear'):
+        return 'ovr'
+    return 'softmax'
+
+def quantize(coef, dtype):
+    """Quantize a feature-major weight matrix; returns (weights, scale)
+
+    int8 uses one symmetric scale factor per class column.
+    """
+    if dtype == 'float32':
+        return coef.astype(np.float32), None
+    if dtype == 'float16':
+        return coef.astype(np.float16), None
+    if dtype == 'int8':
+        scale = np.abs(coef).max(axis=0) / 127
+        scale[scale == 0] = 1
+        weights = np.clip(np.round(coef / scale), -127, 127).astype(np.int8)
+        return weights, scale.astype(np.float32)
+    raise ValueError(f"Unsupported dtype: {dtype}")
+
+def export_compact_model(vectorizer, model, path='expense_categorizer.bin',
+                         prune_threshold=0.0, dtype='float32'):
+    """Export a fitted TfidfVectorizer + linear classifier
+
+    With ``prune_threshold`` > 0, weights smaller in magnitude are zeroed
+    and terms left with no weight for any class lose their weight rows.
+    They stay in a norm-only vocabulary with their IDF, so each row's L2
+    norm, and with it every other feature value, matches the full model.
+    ``dtype`` selects float32, float16 or int8 weights.
+    """
+    config = _vectorizer_config(vectorizer)
+
+    # Vocabulary in column order, so term i owns row i of the weights
+    terms = [None] * len(vectorizer.vocabulary_)
+    for term, index in vectorizer.vocabulary_.items():
+        terms[index] = term
+
+    if config['use_idf']:
+        idf = vectorizer.idf_.astype(np.float32)
+    else:
+        idf = np.ones(len(terms), dtype=np.float32)
+
+    # Stored feature-major so a transaction's terms gather whole rows
+    coef = np.array(model.coef_.T, dtype=np.float64)
+    norm_terms, norm_idf = [], idf[:0]
+    if prune_threshold > 0:
+        coef[np.abs(coef) < prune_threshold] = 0
+        live = np.any(coef != 0, axis=1)
+        dead = np.flatnonzero(~live)
+        norm_terms = [terms[i] for i in dead]
+        norm_idf = idf[dead]
+        live = np.flatnonzero(live)
+        terms = [terms[i] for i in live]
+        idf = idf[live]
+        coef = coef[live]
+    weights, scale = quantize(coef, dtype)
+
+    header = {
+        'vectorizer': config,
+        'vocabulary': terms,
+        # Terms that only contribute to the norm; they have no weight rows
+        'norm_vocabulary': norm_terms,
+        'classes': [str(c) for c in model.classes_],
+        'proba': _proba_mode(model),
+        'quantization': {
+            'dtype': dtype,
+            'prune_threshold': prune_threshold,
+            'dropped_terms': len(norm_terms)
+        }
+    }
+    arrays = {
+        'idf': idf,
+        'norm_idf': norm_idf,
+        'coef': np.ascontiguousarray(weights),
+        'intercept': np.asarray(model.intercept_, dtype=np.float32)
+    }
+    if scale is not None:
+        arrays['coef_scale'] = scale
+    write_compact(path, header, arrays, MAGIC, FORMAT_VERSION)
+    print(f"Compact model exported as {path}")
+
+# ========================
+# 2. LOAD
+# ========================
+
+class CompactExpensePredictor(ExpensePredictor):
+    """ExpensePredictor that scores from a compact file using NumPy only"""
+
+    def __init__(self, model_path='expense_categorizer.bin', **kwargs):
+        super().__init__(model_path, **kwargs)
+
+    def _load(self, model_path):
+        """Memory-map the compact artifact"""
+        header, arrays = read_compact(model_path, MAGIC, FORMAT_VERSION)
+        config = header['vectorizer']
+
+        # Weighted terms first; norm-only terms get the columns after them
+        terms = header['vocabulary'] + header.get('norm_vocabulary', [])
+        self.vocabulary = {term: i for i, term in enumerate(terms)}
+        self.weighted_terms = len(header['vocabulary'])
+        self.classes_ = np.array(header['classes'])
+        self.proba_mode = header['proba']
+        self.lowercase = config['lowercase']
+        self.token_re = re.compile(config['token_pattern'])
+        self.min_n, self.max_n = config['ngram_range']
+        self.sublinear_tf = config['sublinear_tf']
+        self.norm = config['norm']
+
+        self.idf = arrays['idf']
+        if 'norm_idf' in arrays and len(arrays['norm_idf']):
+            self.idf = np.concatenate([self.idf, arrays['norm_idf']])
+        self.coef = arrays['coef']
+        self.coef_scale = arrays.get('coef_scale')
+        self.intercept = arrays['intercept']
+
+    def _analyze(self, text):
+        """Word n-grams exactly as TfidfVectorizer builds them"""
+        if self.lowercase:
+            text = text.lower()
+        tokens = self.token_re.findall(text)
+        if self.max_n == 1:
+            return tokens
+
+        ngrams = list(tokens) if self.min_n == 1 else []
+        n_tokens = len(tokens)
+        for n in range(max(self.min_n, 2), min(self.max_n, n_tokens) + 1):
+            for i in range(n_tokens - n + 1):
+                ngrams.append(' '.join(tokens[i:i + n]))
+        return ngrams
+
+    def _transform(self, processed_texts):
+        """TF-IDF rows as flat (row, column, value) arrays"""
+        vocabulary = self.vocabulary
+        rows, cols, counts = [], [], []
+        for row, text in enumerate(processed_texts):
+            term_counts = {}
+            for term in self._analyze(text):
+                index = vocabulary.get(term)
+                if index is not None:
+                    term_counts[index] = term_counts.get(index, 0) + 1
+            rows.extend([row] * len(term_counts))
+            cols.extend(term_counts.keys())
+            counts.extend(term_counts.values())
+
+        rows = np.array(rows, dtype=np.intp)
+        cols = np.array(cols, dtype=np.intp)
+        values = np.array(counts, dtype=np.float32)
+
+        if self.sublinear_tf:
+            values = 1 + np.log(values)
+        values *= self.idf[cols]
+
+        if self.norm == 'l2' and len(values):
+            norms = np.zeros(len(processed_texts), dtype=np.float32)
+            np.add.at(norms, rows, values ** 2)
+            values /= np.sqrt(norms)[rows]
+        return rows, cols, values
+
+    def _decision_function(self, processed_texts):
+        """Linear class scores for a batch of preprocessed texts"""
+        rows, cols, values = self._transform(processed_texts)
+        scores = np.tile(self.intercept.astype(np.float64), (len(processed_texts), 1))
+        if self.weighted_terms < len(self.vocabulary):
+            # Norm-only terms were already counted in the norm
+            weighted = cols < self.weighted_terms
+            rows, cols, values = rows[weighted], cols[weighted], values[weighted]
+        if len(values):
+            weights = self.coef[cols]
+            if weights.dtype != np.float32:
+                weights = weights.astype(np.float32)
+            if self.coef_scale is not None:
+                weights *= self.coef_scale
+            contributions = weights * values[:, None]
+            # rows is sorted, so each transaction's terms are contiguous
+            starts = np.flatnonzero(np.r_[True, rows[1:] != rows[:-1]])
+            scores[rows[starts]] += np.add.reduceat(contributions, starts, axis=0)
+        return scores
+
+    def _predict_proba(self, processed_texts):
+        """Probabilities matching the exported sklearn classifier"""
+        scores = self._decision_function(processed_texts)
+
+        if self.proba_mode == 'binary':
+            positive = 1 / (1 + np.exp(-scores[:, 0]))
+            return np.column_stack([1 - positive, positive])
+
+        if self.proba_mode == 'ovr':
+            proba = 1 / (1 + np.exp(-scores))
+            return proba / proba.sum(axis=1, keepdims=True)
+
+        scores -= scores.max(axis=1, keepdims=True)
+        np.exp(scores, out=scores)
+        scores /= scores.sum(axis=1, keepdims=True)
+        return scores
+
+# ========================
+# 3. COMPRESSION REPORT
+# ========================
+
+def _measure(predictor, texts, labels, repeats=5):
+    """Accuracy and best-of-N per-row batch latency of a predictor"""
+    processed = [predictor.preprocess(t) for t in texts]
+    latency = float('inf')
+    for _ in range(repeats):
+        start = time.perf_counter()
+        proba = predictor._predict_proba(processed)
+        latency = min(latency, (time.perf_counter() - start) / len(texts))
+    predicted = np.asarray(predictor.classes_)[proba.argmax(axis=1)]
+    return float(np.mean(predicted == np.asarray(labels))), latency
+
+def compression_report(reference_path, compressed_path, texts, labels):
+    """Accuracy delta, latency change and size of a compressed model"""
+    reference = CompactExpensePredictor(reference_path, merchant_index_path=None)
+    compressed = CompactExpensePredictor(compressed_path, merchant_index_path=None)
+    ref_accuracy, ref_latency = _measure(reference, texts, labels)
+    accuracy, latency = _measure(compressed, texts, labels)
+    return {
+        'reference_accuracy': ref_accuracy,
+        'accuracy': accuracy,
+        'accuracy_delta': accuracy - ref_accuracy,
+        'reference_latency_us': ref_latency * 1e6,
+        'latency_us': latency * 1e6,
+        'latency_change': latency / ref_latency - 1,
+        'reference_terms': reference.weighted_terms,
+        'terms': compressed.weighted_terms,
+        'reference_bytes': os.path.getsize(reference_path),
+        'bytes': os.path.getsize(compressed_path)
+    }
+
+# ========================
+# MAIN EXECUTION
+# ========================
+
+def main(argv=None):
+    import pickle
+
+    parser = argparse.ArgumentParser(description="Export a compact, optionally compressed model")
+    parser.add_argument('source', nargs='?', default='expense_categorizer.pkl')
+    parser.add_argument('target', nargs='?', default='expense_categorizer.bin')
+    parser.add_argument('--dtype', choices=['float32', 'float16', 'int8'], default='float32')
+    parser.add_argument('--prune', type=float, default=0.0,
+                        help="Zero weights with a smaller magnitude")
+    parser.add_argument('--report', action='store_true',
+                        help="Compare against the uncompressed export on the sample dataset")
+    args = parser.parse_args(argv)
+
+    with open(args.source, 'rb') as f:
+        data = pickle.load(f)
+    export_compact_model(data['vectorizer'], data['model'], args.target, args.prune, args.dtype)
+
+    if args.report:
+        from train_model import create_sample_dataset
+
+        reference_path = args.target + '.reference'
+        export_compact_model(data['vectorizer'], data['model'], reference_path)
+        df = create_sample_dataset()
+        report = compression_report(reference_path, args.target,
+                                    list(df['transaction']), list(df['category']))
+        os.remove(reference_path)
+
+        print("\n" + "=" * 60)
+        print("COMPRESSION REPORT")
+        print("=" * 60)
+        print(f"Weights:   {args.dtype}, prune < {args.prune}")
+        print(f"Terms:     {report['reference_terms']:,} -> {report['terms']:,}")
+        print(f"Size:      {report['reference_bytes']:,} -> {report['bytes']:,} bytes")
+        print(f"Accuracy:  {report['reference_accuracy'] * 100:.2f}% -> {report['accuracy'] * 100:.2f}% "
+              f"({report['accuracy_delta'] * 100:+.2f} pts)")
+        print(f"Latency:   {report['reference_latency_us']:.2f} -> {report['latency_us']:.2f} us/row "
+              f"({report['latency_change'] * 100:+.1f}%)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+"""
+DUPLICATE DETECTION
+Ingest-time detection of double-submitted and re-imported expenses
+"""
+
+import hashlib
+import random
+import zlib
+from collections import deque
+from datetime import date
+
+from transaction_parser import parse_transaction
+
+# Mersenne prime for the universal hash family used by MinHash
+_PRIME = (1 << 61) - 1
+
+class DuplicateDetector:
+    """Exact and near-duplicate checks in constant time per expense
+
+    Exact duplicates share a hash of (date, normalized text, amount).
+    Near duplicates have the same amount, fall within ``window_days`` of
+    each other and have text whose MinHash signatures suggest a Jaccard
+    similarity of at least ``threshold``. Signatures are banded for LSH,
+    so a check only compares against the few expenses sharing a band
+    bucket, and buckets forget entries older than the window.
+
+    Only expenses within the window of the newest one seen are signed,
+    since the rest can't be near duplicates of a new expense; older ones
+    just get an exact fingerprint. ``sync`` catches up with expenses
+    appended to the store since ``size``, so other sessions' adds and
+    imports are folded in without a rebuild.
+    """
+
+    def __init__(self, window_days=3, num_perm=32, bands=8, threshold=0.8, shingle_size=3):
+        self.window_days = window_days
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows_per_band = num_perm // bands
+        self.threshold = threshold
+        self.shingle_size = shingle_size
+
+        # Fixed seed, so signatures are reproducible across runs
+        rng = random.Random(42)
+        self._perms = [(rng.randrange(1, _PRIME), rng.randrange(_PRIME)) for _ in range(num_perm)]
+        self.fingerprints = {}
+        self.buckets = {}
+        self.size = 0
+        # Day ordinal of the newest expense added
+        self.newest = None
+
+    @staticmethod
+    def fingerprint(expense_date, text, amount):
+        key = f"{expense_date}|{text}|{amount}"
+        return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+    def _shingles(self, text):
+        n = self.shingle_size
+        padded = f" {text} "
+        return {zlib.crc32(padded[i:i + n].encode('utf-8'))
+                for i in range(max(len(padded) - n + 1, 1))}
+
+    def _signature(self, text):
+        shingles = self._shingles(text)
+        return tuple(min((a * s + b) % _PRIME for s in shingles) for a, b in self._perms)
+
+    def _band_keys(self, signature):
+        r = self.rows_per_band
+        return [(band, signature[band * r:(band + 1) * r]) for band in range(self.bands)]
+
+    def _similarity(self, sig_a, sig_b):
+        return sum(a == b for a, b in zip(sig_a, sig_b)) / self.num_perm
+
+    def _prepare(self, expense_date, transaction_text, amount):
+        text = parse_transaction(transaction_text).text
+        day = date.fromisoformat(expense_date).toordinal()
+        return text, day, self.fingerprint(expense_date, text, amount), self._signature(text)
+
+    def check(self, expense_date, transaction_text, amount):
+        """(kind, expense index) of an earlier duplicate, or None
+
+        ``kind`` is 'exact' or 'near'.
+        """
+        text, day, fingerprint, signature = self._prepare(expense_date, transaction_text, amount)
+        if fingerprint in self.fingerprints:
+            return 'exact', self.fingerprints[fingerprint]
+
+        for key in self._band_keys(signature):
+            for other_day, index, other_amount, other_signature in self.buckets.get(key, ()):
+                if (abs(day - other_day) <= self.window_days and other_amount == amount
+                        and self._similarity(signature, other_signature) >= self.threshold):
+                    return 'near', index
+        return None
+
+    def add(self, expense_date, transaction_text, amount, index):
+        """Record an accepted expense stored at ``index``"""
+        text = parse_transaction(transaction_text).text
+        day = date.fromisoformat(expense_date).toordinal()
+        self.fingerprints[self.fingerprint(expense_date, text, amount)] = index
+        self.size += 1
+        if self.newest is None or day > self.newest:
+            self.newest = day
+        if day < self.newest - self.window_days:
+            return
+
+        signature = self._signature(text)
+        for key in self._band_keys(signature):
+            bucket = self.buckets.setdefault(key, deque())
+            bucket.append((day, index, amount, signature))
+            # Expenses mostly arrive in date order, so stale ones sit in front
+            while bucket and bucket[0][0] < day - self.window_days:
+                bucket.popleft()
+
+    def sync(self, expenses):
+        """Add the expenses appended to ``expenses`` since ``size``
+
+        A list shorter than what was added (data replaced) is re-indexed.
+        """
+        if len(expenses) < self.size:
+            self.fingerprints.clear()
+            self.buckets.clear()
+            self.size = 0
+            self.newest = None
+        new = expenses[self.size:]
+        if not new:
+            return
+        # The newest date first, so the batch's older rows are not signed
+        newest = date.fromisoformat(max(expense['date'] for expense in new)).toordinal()
+        if self.newest is None or newest > self.newest:
+            self.newest = newest
+        for index, expense in enumerate(new, self.size):
+            self.add(expense['date'], expense['transaction'], expense['amount'], index)
+
+    @classmethod
+    def build(cls, expenses, **kwargs):
+        """Index an existing expense list"""
+        detector = cls(**kwargs)
+        detector.sync(expenses)
+        return detector
@@ -0,0 +1,215 @@
+"""
+EXPENSE ARCHIVE
+Columnar, memory-mapped snapshot of the expense history for vectorized
+analytics over millions of rows
+
+The archive is an offline export: the assistant keeps reading and writing
+its store, and nothing in it reads the archive. An archive records the
+store version it was taken at; ``refresh_archive`` (or the ``refresh``
+command, e.g. from cron) re-exports it once the store has changed.
+"""
+
+import argparse
+import os
+import time
+from datetime import date
+
+import numpy as np
+
+from compact_file import read_compact, write_compact
+
+ARCHIVE_MAGIC = b'SLAEXPNS'
+ARCHIVE_VERSION = 1
+
+def _to_ordinal(iso_date):
+    return date.fromisoformat(iso_date).toordinal()
+
+def export_archive(expenses, path='user_data.archive', source_version=None):
+    """Write expenses (dicts as stored by the assistant) as a columnar archive
+
+    Columns: ``day`` (int32 date ordinals), ``category`` (int16 codes into
+    the header's category list), ``amount`` and ``confidence``
+    (float64) and the transaction texts as one UTF-8 blob indexed by
+    ``text_offsets``. Fields outside these are not archived.
+    ``source_version`` is the version of the store the expenses came from.
+    """
+    n = len(expenses)
+    days = np.empty(n, dtype=np.int32)
+    codes = np.empty(n, dtype=np.int16)
+    amounts = np.empty(n, dtype=np.float64)
+    confidences = np.empty(n, dtype=np.float64)
+    offsets = np.empty(n + 1, dtype=np.int64)
+    offsets[0] = 0
+    categories = {}
+    texts = []
+
+    # Dates repeat heavily, so each distinct string is parsed once
+    ordinals = {}
+    for i, expense in enumerate(expenses):
+        day = ordinals.get(expense['date'])
+        if day is None:
+            day = ordinals[expense['date']] = _to_ordinal(expense['date'])
+        days[i] = day
+        codes[i] = categories.setdefault(expense['category'], len(categories))
+        amounts[i] = expense['amount']
+        confidence = expense.get('confidence')
+        confidences[i] = np.nan if confidence is None else confidence
+        text = expense['transaction'].encode('utf-8')
+        texts.append(text)
+        offsets[i + 1] = offsets[i] + len(text)
+
+    header = {
+        'rows': n,
+        'categories': list(categories),
+        'source_version': source_version,
+        # Sorted days let date ranges be found by binary search
+        'sorted_by_day': bool(np.all(days[1:] >= days[:-1])) if n else True
+    }
+    arrays = {
+        'day': days,
+        'category': codes,
+        'amount': amounts,
+        'confidence': confidences,
+        'text_offsets': offsets,
+        'text_blob': np.frombuffer(b''.join(texts), dtype=np.uint8)
+    }
+    write_compact(path, header, arrays, ARCHIVE_MAGIC, ARCHIVE_VERSION)
+    return path
+
+def refresh_archive(store, path='user_data.archive'):
+    """Re-export ``store`` to ``path`` unless the archive is current; True if rewritten"""
+    store.refresh()
+    if os.path.exists(path):
+        if ExpenseArchive(path).source_version == store.version:
+            return False
+    # Read before the expenses, so a change made meanwhile only makes the
+    # archive look stale again
+    version = store.version
+    export_archive(store.data['expenses'], path, source_version=version)
+    return True
+
+class ExpenseArchive:
+    """Read-only, memory-mapped view of an archive written by export_archive
+
+    Aggregations are NumPy reductions over the mapped columns; only rows
+    that are explicitly indexed are turned into dicts.
+    """
+
+    def __init__(self, path='user_data.archive'):
+        self.path = path
+        header, arrays = read_compact(path, ARCHIVE_MAGIC, ARCHIVE_VERSION)
+        self.categories = header['categories']
+        # None for archives not exported from a store
+        self.source_version = header.get('source_version')
+        self.sorted_by_day = header['sorted_by_day']
+        self.day = arrays['day']
+        self.category = arrays['category']
+        self.amount = arrays['amount']
+        self.confidence = arrays['confidence']
+        self._offsets = arrays['text_offsets']
+        self._blob = arrays['text_blob']
+
+    def __len__(self):
+        return len(self.day)
+
+    def __getitem__(self, index):
+        """One expense as the dict the assistant stores"""
+        if index < 0:
+            index += len(self)
+        start, end = self._offsets[index], self._offsets[index + 1]
+        amount = float(self.amount[index])
+        confidence = float(self.confidence[index])
+        return {
+            'date': date.fromordinal(int(self.day[index])).isoformat(),
+            'transaction': self._blob[start:end].tobytes().decode('utf-8'),
+            'amount': int(amount) if amount.is_integer() else amount,
+            'category': self.categories[self.category[index]],
+            'confidence': None if np.isnan(confidence) else confidence
+        }
+
+    def _window(self, since=None, until=None):
+        """Row slice (sorted archives) or boolean mask for [since, until] ISO dates"""
+        lo = _to_ordinal(since) if since is not None else None
+        hi = _to_ordinal(until) if until is not None else None
+        if self.sorted_by_day:
+            start = 0 if lo is None else int(np.searchsorted(self.day, lo, side='left'))
+            end = len(self) if hi is None else int(np.searchsorted(self.day, hi, side='right'))
+            return slice(start, end)
+        mask = np.ones(len(self), dtype=bool)
+        if lo is not None:
+            mask &= self.day >= lo
+        if hi is not None:
+            mask &= self.day <= hi
+        return mask
+
+    def category_totals(self, since=None, until=None):
+        """{category: total} for expenses dated within [since, until]"""
+        window = self._window(since, until)
+        totals = np.bincount(self.category[window], weights=self.amount[window],
+                             minlength=len(self.categories))
+        counts = np.bincount(self.category[window], minlength=len(self.categories))
+        return {self.categories[code]: float(totals[code]) for code in np.flatnonzero(counts)}
+
+    def daily_totals(self, since=None, until=None):
+        """(day ordinals, totals) of days with spending, in date order"""
+        window = self._window(since, until)
+        days, inverse = np.unique(self.day[window], return_inverse=True)
+        return days, np.bincount(inverse, weights=self.amount[window], minlength=len(days))
+
+    def stats(self, since=None, until=None):
+        """Count, total and mean amount within [since, until]"""
+        amounts = self.amount[self._window(since, until)]
+        total = float(amounts.sum())
+        return {'count': len(amounts), 'total': total,
+                'mean': total / len(amounts) if len(amounts) else 0.0}
+
+# ========================
+# MAIN EXECUTION
+# ========================
+
+def main(argv=None):
+    from storage import open_store
+
+    parser = argparse.ArgumentParser(description="Columnar expense archive")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    build = subparsers.add_parser('build', help="Archive the expenses of a user data store")
+    build.add_argument('source', nargs='?', default='user_data.json')
+    build.add_argument('target', nargs='?', default='user_data.archive')
+    refresh = subparsers.add_parser('refresh', help="Rebuild an archive if its store has changed")
+    refresh.add_argument('source', nargs='?', default='user_data.json')
+    refresh.add_argument('target', nargs='?', default='user_data.archive')
+    summary = subparsers.add_parser('summary', help="Spending by category from an archive")
+    summary.add_argument('path', nargs='?', default='user_data.archive')
+    summary.add_argument('--since', help="First ISO date to include")
+    summary.add_argument('--until', help="Last ISO date to include")
+    args = parser.parse_args(argv)
+
+    if args.command == 'build':
+        start = time.perf_counter()
+        store = open_store(args.source)
+        expenses = store.data['expenses']
+        export_archive(expenses, args.target, source_version=store.version)
+        print(f"✓ Archived {len(expenses):,} expenses to {args.target} "
+              f"in {time.perf_counter() - start:.1f}s")
+        return
+
+    if args.command == 'refresh':
+        start = time.perf_counter()
+        store = open_store(args.source)
+        if refresh_archive(store, args.target):
+            print(f"✓ Archived {len(store.data['expenses']):,} expenses to {args.target} "
+                  f"in {time.perf_counter() - start:.1f}s")
+        else:
+            print(f"✓ {args.target} is up to date")
+        return
+
+    start = time.perf_counter()
+    archive = ExpenseArchive(args.path)
+    totals = archive.category_totals(args.since, args.until)
+    elapsed = (time.perf_counter() - start) * 1000
+    for category, total in sorted(totals.items(), key=lambda x: x[1], reverse=True):
+        print(f"  {category:15s} ₹{total:,.2f}")
+    print(f"{len(archive):,} rows summarized in {elapsed:.1f} ms")
+
+if __name__ == "__main__":
+    main()
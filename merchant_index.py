@@ -0,0 +1,174 @@
+"""
+MERCHANT INDEX
+Token trie of known merchant phrases that answers before the ML model
+"""
+
+import json
+import threading
+
+# Trie key holding the category of the phrase ending at a node. Preprocessed
+# text only contains lowercase letters, so it can never collide with a token.
+_CATEGORY = '$'
+
+# The index only answers ahead of the model if it was this precise on
+# held-out labeled transactions, measured over at least this many hits
+MIN_PRECISION = 0.99
+MIN_EVALUATED_HITS = 20
+
+class MerchantIndex:
+    """Multi-pattern matcher from merchant phrases to categories"""
+
+    def __init__(self, max_phrase_tokens=3):
+        self.max_phrase_tokens = max_phrase_tokens
+        self.root = {}
+        self.size = 0
+        # Set by evaluate()
+        self.precision = None
+        self.evaluated_hits = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def add(self, phrase, category):
+        """Register a preprocessed merchant phrase"""
+        tokens = phrase.split()
+        if not tokens:
+            return
+        node = self.root
+        for token in tokens:
+            node = node.setdefault(token, {})
+        if _CATEGORY not in node:
+            self.size += 1
+        node[_CATEGORY] = category
+        self.max_phrase_tokens = max(self.max_phrase_tokens, len(tokens))
+
+    def match(self, processed_text):
+        """Category of the known merchant in the text, or None
+
+        Every phrase occurring in the text is found in one left-to-right pass.
+        If the phrases disagree the longest one wins, and a tie between
+        different categories is left to the model.
+        """
+        tokens = processed_text.split()
+        best_length = 0
+        best = set()
+        for start in range(len(tokens)):
+            node = self.root
+            for length, token in enumerate(tokens[start:start + self.max_phrase_tokens], 1):
+                node = node.get(token)
+                if node is None:
+                    break
+                category = node.get(_CATEGORY)
+                if category is None:
+                    continue
+                if length > best_length:
+                    best_length = length
+                    best = {category}
+                elif length == best_length:
+                    best.add(category)
+
+        category = best.pop() if len(best) == 1 else None
+        with self._lock:
+            if category is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return category
+
+    def stats(self):
+        """Lookup counters for measuring the fast-path hit rate"""
+        lookups = self.hits + self.misses
+        return {
+            'phrases': self.size,
+            'lookups': lookups,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0
+        }
+
+    @property
+    def trusted(self):
+        """Whether evaluate() showed the index precise enough to skip the model"""
+        return (self.precision is not None and self.evaluated_hits >= MIN_EVALUATED_HITS
+                and self.precision >= MIN_PRECISION)
+
+    @property
+    def confidence(self):
+        """Percent chance that a hit is right
+
+        The measured precision, smoothed with Laplace's rule of succession
+        so that a perfect score over a few dozen hits doesn't claim certainty.
+        """
+        if self.precision is None:
+            return None
+        correct = self.precision * self.evaluated_hits
+        return (correct + 1) / (self.evaluated_hits + 2) * 100
+
+    def evaluate(self, texts, categories):
+        """Measure precision on labeled, preprocessed texts the index wasn't built from"""
+        hits = correct = 0
+        for text, category in zip(texts, categories):
+            predicted = self.match(text)
+            if predicted is not None:
+                hits += 1
+                correct += predicted == category
+        self.precision = correct / hits if hits else None
+        self.evaluated_hits = hits
+        self.hits = self.misses = 0
+        return {'hits': hits, 'correct': correct, 'precision': self.precision}
+
+    @classmethod
+    def from_training_data(cls, texts, categories, max_phrase_tokens=2, min_support=2):
+        """Build an index of the phrases that only ever mean one category
+
+        Every n-gram up to ``max_phrase_tokens`` long is counted across the
+        labeled, preprocessed texts. N-grams seen under more than one
+        category are ambiguous ("bill", "order") and are left out, as are
+        n-grams seen fewer than ``min_support`` times and longer phrases
+        that only extend an already unambiguous one. Measure the result
+        with ``evaluate`` on texts held out from ``texts``.
+        """
+        seen = {}
+        support = {}
+        for text, category in zip(texts, categories):
+            tokens = text.split()
+            for n in range(1, max_phrase_tokens + 1):
+                for i in range(len(tokens) - n + 1):
+                    phrase = ' '.join(tokens[i:i + n])
+                    seen.setdefault(phrase, set()).add(category)
+                    support[phrase] = support.get(phrase, 0) + 1
+
+        index = cls(max_phrase_tokens)
+        for phrase in sorted(seen, key=lambda p: len(p.split())):
+            labels = seen[phrase]
+            if len(labels) != 1 or support[phrase] < min_support:
+                continue
+            category = next(iter(labels))
+            if index.match(phrase) == category:
+                continue
+            index.add(phrase, category)
+
+        index.hits = index.misses = 0
+        return index
+
+    def save(self, filename='merchant_index.json'):
+        """Save the trie"""
+        with open(filename, 'w') as f:
+            json.dump({'max_phrase_tokens': self.max_phrase_tokens,
+                       'size': self.size,
+                       'precision': self.precision,
+                       'evaluated_hits': self.evaluated_hits,
+                       'trie': self.root}, f)
+        print(f"Merchant index saved as {filename}")
+
+    @classmethod
+    def load(cls, filename='merchant_index.json'):
+        """Load a saved trie"""
+        with open(filename, 'r') as f:
+            data = json.load(f)
+        index = cls(data['max_phrase_tokens'])
+        index.root = data['trie']
+        index.size = data['size']
+        index.precision = data.get('precision')
+        index.evaluated_hits = data.get('evaluated_hits', 0)
+        return index
@@ -1,54 +1,305 @@
+import hashlib
+import json
+import logging
+import os
 import pickle
-import re
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from transaction_parser import parse_transaction
+
+BATCH_CHUNK_SIZE = 10000
+
+# Checkpoint of the online categorizer that user corrections are folded into
+ONLINE_MODEL_PATH = 'expense_categorizer_online.pkl'
+
+# User corrections, answered ahead of the model
+CORRECTIONS_PATH = 'expense_corrections.jsonl'
+
+logger = logging.getLogger(__name__)
+
+class PredictionCache:
+    """Size-bounded LRU cache of prediction results with optional TTL"""
+    
+    def __init__(self, capacity=1024, ttl=None):
+        self.capacity = capacity
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+    
+    def get(self, key):
+        """Return a copy of the cached result, or None on a miss"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            
+            result, expires_at = entry
+            if expires_at is not None and time.monotonic() >= expires_at:
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return dict(result)
+    
+    def put(self, key, result):
+        """Store a result, evicting the least recently used entry if full"""
+        if self.capacity <= 0:
+            return
+        expires_at = time.monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            self._entries[key] = (dict(result), expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.capacity:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+    
+    def clear(self):
+        """Drop every entry (counters are kept)"""
+        with self._lock:
+            self._entries.clear()
+    
+    def stats(self):
+        """Counters for sizing the cache against real traffic"""
+        lookups = self.hits + self.misses
+        return {
+            'size': len(self._entries),
+            'capacity': self.capacity,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'expirations': self.expirations,
+            'hit_rate': self.hits / lookups if lookups else 0.0
+        }
+
+class CorrectionOverlay:
+    """Categories users chose for transactions, keyed on normalized text
+
+    Corrections are appended to ``path`` as JSON lines, so writers in other
+    processes never overwrite each other; the latest correction of a text
+    wins. ``check_for_update`` re-reads the file after another writer
+    appended to it.
+    """
+    
+    def __init__(self, path=CORRECTIONS_PATH):
+        self.path = path
+        self.corrections = {}
+        self.hits = 0
+        self._stamp = None
+        self.check_for_update()
+    
+    def _read_stamp(self):
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+    
+    def check_for_update(self):
+        """Re-read the file if it changed; True if it was re-read"""
+        stamp = self._read_stamp()
+        if stamp == self._stamp:
+            return False
+        corrections = {}
+        if stamp is not None:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # A torn last line from an interrupted append
+                        continue
+                    corrections[record['text']] = record['category']
+        self.corrections = corrections
+        self._stamp = stamp
+        return True
+    
+    def add(self, processed, category):
+        """Record the category for a normalized transaction text"""
+        line = json.dumps({'text': processed, 'category': category}, ensure_ascii=False) + '\n'
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(line)
+        self.corrections[processed] = category
+    
+    def get(self, processed):
+        category = self.corrections.get(processed)
+        if category is not None:
+            self.hits += 1
+        return category
+    
+    def stats(self):
+        return {'size': len(self.corrections), 'hits': self.hits}
 
 class ExpensePredictor:
     """Easy-to-use expense predictor for new transactions"""
     
-    def __init__(self, model_path='expense_categorizer.pkl'):
+    def __init__(self, model_path='expense_categorizer.pkl', cache_size=1024, cache_ttl=None,
+                 merchant_index_path='merchant_index.json', verbose=True,
+                 corrections_path=CORRECTIONS_PATH):
         """Load the trained model"""
+        self.model_path = model_path
+        self.cache = PredictionCache(cache_size, cache_ttl)
+        self.corrections = CorrectionOverlay(corrections_path) if corrections_path else None
         try:
-            with open(model_path, 'rb') as f:
-                data = pickle.load(f)
-                self.vectorizer = data['vectorizer']
-                self.model = data['model']
-            print("✓ Model loaded successfully!")
+            self._load(model_path)
+            if verbose:
+                print("✓ Model loaded successfully!")
         except FileNotFoundError:
-            print("ERROR: Model file not found. Please run the training script first!")
+            if verbose:
+                print("ERROR: Model file not found. Please run the training script first!")
             raise
+        
+        self.merchant_index = None
+        if merchant_index_path and os.path.exists(merchant_index_path):
+            from merchant_index import MerchantIndex
+            merchant_index = MerchantIndex.load(merchant_index_path)
+            # An index that wasn't measured precise enough would only add errors
+            if merchant_index.trusted:
+                self.merchant_index = merchant_index
+            else:
+                logger.warning("Ignoring merchant index %s: precision %s over %d hits",
+                               merchant_index_path, merchant_index.precision,
+                               merchant_index.evaluated_hits)
+    
+    def reload(self):
+        """Re-read the model file and invalidate cached predictions"""
+        self._load(self.model_path)
+        self.cache.clear()
+    
+    def _load(self, model_path):
+        """Read the pickled vectorizer and model"""
+        with open(model_path, 'rb') as f:
+            data = pickle.load(f)
+            self.vectorizer = data['vectorizer']
+            self.model = data['model']
+        self.classes_ = self.model.classes_
     
     def preprocess(self, text):
         """Preprocess transaction text"""
-        text = text.lower()
-        text = re.sub(r'[^a-zA-Z\s]', ' ', text)
-        text = ' '.join(text.split())
-        return text
+        return parse_transaction(text).text
     
-    def predict_category(self, transaction_text):
-        """Predict category for a single transaction"""
-        processed = self.preprocess(transaction_text)
-        X_tfidf = self.vectorizer.transform([processed])
+    def _predict_proba(self, processed_texts):
+        """Score preprocessed texts as one sparse matrix"""
+        X_tfidf = self.vectorizer.transform(processed_texts)
+        return self.model.predict_proba(X_tfidf)
+    
+    def _format_results(self, probabilities, top_k=3):
+        """Turn a probability matrix into result dicts"""
+        classes = np.asarray(self.classes_)
+        top_k = min(top_k, probabilities.shape[1])
         
-        category = self.model.predict(X_tfidf)[0]
-        probabilities = self.model.predict_proba(X_tfidf)[0]
-        confidence = max(probabilities) * 100
+        # Partial selection of the top-k columns, then order just those k
+        top_indices = np.argpartition(-probabilities, top_k - 1, axis=1)[:, :top_k]
+        top_probs = np.take_along_axis(probabilities, top_indices, axis=1)
+        order = np.argsort(-top_probs, axis=1)
+        top_indices = np.take_along_axis(top_indices, order, axis=1)
+        top_probs = np.take_along_axis(top_probs, order, axis=1) * 100
         
-        top_indices = probabilities.argsort()[-3:][::-1]
-        top_predictions = [(self.model.classes_[i], probabilities[i] * 100) 
-                          for i in top_indices]
+        top_labels = classes[top_indices].tolist()
+        top_probs = top_probs.tolist()
         
+        results = []
+        for labels, probs in zip(top_labels, top_probs):
+            results.append({
+                'category': labels[0],
+                'confidence': probs[0],
+                'top_predictions': list(zip(labels, probs)),
+                'source': 'model'
+            })
+        return results
+    
+    def _match_correction(self, processed):
+        """Answer from the user's corrections, or None"""
+        if self.corrections is None:
+            return None
+        category = self.corrections.get(processed)
+        if category is None:
+            return None
+        return {
+            'category': category,
+            'confidence': 100.0,
+            'top_predictions': [(category, 100.0)],
+            'source': 'correction'
+        }
+    
+    def _match_merchant(self, processed):
+        """Answer from the merchant index, or None to fall through to the model"""
+        if self.merchant_index is None:
+            return None
+        category = self.merchant_index.match(processed)
+        if category is None:
+            return None
+        confidence = self.merchant_index.confidence
         return {
             'category': category,
             'confidence': confidence,
-            'top_predictions': top_predictions
+            'top_predictions': [(category, confidence)],
+            'source': 'merchant'
         }
     
-    def predict_batch(self, transactions):
-        """Predict categories for multiple transactions"""
+    def predict_category(self, transaction_text):
+        """Predict category for a single transaction
+        
+        The result's ``source`` says whether a user correction, the
+        merchant index or the model answered.
+        """
+        return self._predict_processed(self.preprocess(transaction_text))
+    
+    def predict_parsed(self, parsed):
+        """Predict from a ParsedTransaction without re-scanning the text"""
+        return self._predict_processed(parsed.text)
+    
+    def _predict_processed(self, processed):
+        result = self._match_correction(processed) or self._match_merchant(processed)
+        if result is not None:
+            return result
+        
+        result = self.cache.get(processed)
+        if result is None:
+            result = self._format_results(self._predict_proba([processed]))[0]
+            self.cache.put(processed, result)
+        return result
+    
+    def predict_batch(self, transactions, chunk_size=BATCH_CHUNK_SIZE):
+        """Predict categories for multiple transactions
+        
+        Transactions are scored in chunks of ``chunk_size`` rows, each with a
+        single transform and a single predict_proba call over the distinct
+        texts that were not already cached.
+        """
         results = []
-        for transaction in transactions:
-            result = self.predict_category(transaction)
-            result['transaction'] = transaction
-            results.append(result)
+        for start in range(0, len(transactions), chunk_size):
+            chunk = transactions[start:start + chunk_size]
+            processed = [self.preprocess(t) for t in chunk]
+            
+            known = {}
+            for text in processed:
+                if text not in known:
+                    known[text] = (self._match_correction(text) or self._match_merchant(text)
+                                   or self.cache.get(text))
+            missing = [text for text, result in known.items() if result is None]
+            
+            if missing:
+                scored = self._format_results(self._predict_proba(missing))
+                for text, result in zip(missing, scored):
+                    known[text] = result
+                    self.cache.put(text, result)
+            
+            for transaction, text in zip(chunk, processed):
+                result = dict(known[text])
+                result['transaction'] = transaction
+                results.append(result)
         return results
     
     def interactive_mode(self):
@@ -72,18 +323,169 @@ class ExpensePredictor:
             result = self.predict_category(transaction)
             
             print(f"\n📊 Prediction Results:")
-            print(f"   Category: {result['category']}")
+            print(f"   Category: {result['category']} (via {result['source']})")
             print(f"   Confidence: {result['confidence']:.2f}%")
             print(f"\n   Top 3 predictions:")
             for i, (cat, prob) in enumerate(result['top_predictions'], 1):
                 print(f"   {i}. {cat}: {prob:.2f}%")
 
+def _serving_path(model_path, compact_path, online_path):
+    """The artifact load_predictor picks"""
+    for path in (online_path, compact_path):
+        if path and os.path.exists(path):
+            return path
+    return model_path
+
+def load_predictor(model_path='expense_categorizer.pkl',
+                   compact_path='expense_categorizer.bin', verbose=True,
+                   online_path=None):
+    """Load the fastest available predictor
+    
+    Prefers the sklearn-free compact artifact written by
+    ``ExpenseCategorizer.export_compact``, then the pickle. User
+    corrections are answered from ``CORRECTIONS_PATH`` ahead of either.
+    Passing ``online_path`` (e.g. ``ONLINE_MODEL_PATH``) opts in to serving
+    the online categorizer's checkpoint instead, when it exists; it has the
+    pickle layout, so ExpensePredictor serves it.
+    """
+    path = _serving_path(model_path, compact_path, online_path)
+    if path == compact_path:
+        from compact_model import CompactExpensePredictor
+        return CompactExpensePredictor(compact_path, verbose=verbose)
+    return ExpensePredictor(path, verbose=verbose)
+
+class HotReloadingPredictor:
+    """Predictor that picks up a retrained model without a restart
+    
+    A daemon thread polls the model file's mtime and size. When they change,
+    the file is hashed and loaded into a brand new predictor in that thread,
+    then swapped in with a single reference assignment, so in-flight
+    predictions keep the predictor they started with and never wait on a
+    load. The previous version is kept for rollback(). New user corrections
+    are picked up on the same polls, without reloading the model.
+    """
+    
+    def __init__(self, model_path='expense_categorizer.pkl',
+                 compact_path='expense_categorizer.bin', poll_interval=5.0, verbose=True,
+                 online_path=None):
+        self.model_path = model_path
+        self.compact_path = compact_path
+        self.online_path = online_path
+        self.poll_interval = poll_interval
+        self._swap_lock = threading.Lock()
+        self._previous = None
+        
+        path = self._watched_path()
+        self._stamp = self._file_stamp(path)
+        self._current = (load_predictor(model_path, compact_path, verbose, online_path),
+                         self._content_hash(path))
+        
+        self._stop = threading.Event()
+        self._thread = None
+        if poll_interval:
+            self._thread = threading.Thread(target=self._watch, daemon=True)
+            self._thread.start()
+    
+    @property
+    def version(self):
+        return self._current[1]
+    
+    @property
+    def predictor(self):
+        return self._current[0]
+    
+    def _watched_path(self):
+        """The artifact load_predictor would pick"""
+        return _serving_path(self.model_path, self.compact_path, self.online_path)
+    
+    @staticmethod
+    def _file_stamp(path):
+        stat = os.stat(path)
+        return (path, stat.st_mtime_ns, stat.st_size)
+    
+    @staticmethod
+    def _content_hash(path):
+        """Short content hash used as the model version id"""
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                digest.update(block)
+        return digest.hexdigest()[:12]
+    
+    def _watch(self):
+        while not self._stop.wait(self.poll_interval):
+            try:
+                self.check_for_update()
+            except Exception as e:
+                logger.warning("Model reload check failed: %s", e)
+    
+    def check_for_update(self):
+        """Load and swap in the model file if it changed; True if swapped"""
+        corrections = self.predictor.corrections
+        if corrections is not None:
+            corrections.check_for_update()
+        
+        path = self._watched_path()
+        stamp = self._file_stamp(path)
+        if stamp == self._stamp:
+            return False
+        self._stamp = stamp
+        
+        version = self._content_hash(path)
+        if version == self.version:
+            return False
+        
+        predictor = load_predictor(self.model_path, self.compact_path, verbose=False,
+                                   online_path=self.online_path)
+        with self._swap_lock:
+            self._previous = self._current
+            self._current = (predictor, version)
+        logger.info("Swapped in expense model %s (was %s)", version, self._previous[1])
+        return True
+    
+    def rollback(self):
+        """Return to the previously loaded model version"""
+        with self._swap_lock:
+            if self._previous is None:
+                return False
+            self._current, self._previous = self._previous, self._current
+        logger.info("Rolled back expense model to %s", self.version)
+        return True
+    
+    def stop(self):
+        """Stop watching the model file"""
+        self._stop.set()
+    
+    def preprocess(self, text):
+        return self.predictor.preprocess(text)
+    
+    def predict_category(self, transaction_text):
+        """Predict with the current model, tagging its version id"""
+        return self.predict_parsed(parse_transaction(transaction_text))
+    
+    def predict_parsed(self, parsed):
+        """Predict from a ParsedTransaction with the current model"""
+        predictor, version = self._current
+        result = predictor.predict_parsed(parsed)
+        result['model_version'] = version
+        logger.info("model=%s category=%s source=%s", version, result['category'], result['source'])
+        return result
+    
+    def predict_batch(self, transactions, chunk_size=BATCH_CHUNK_SIZE):
+        """Predict a batch with one model version throughout"""
+        predictor, version = self._current
+        results = predictor.predict_batch(transactions, chunk_size)
+        for result in results:
+            result['model_version'] = version
+        logger.info("model=%s batch=%d", version, len(results))
+        return results
+
 # ========================
 # USAGE EXAMPLES
 # ========================
 
 if __name__ == "__main__":
-    predictor = ExpensePredictor()
+    predictor = load_predictor()
     
     print("\n" + "=" * 60)
     print("EXAMPLE 1: Single Transaction Prediction")
@@ -0,0 +1,82 @@
+"""
+SPENDING ROLLUPS
+Per-day, per-category spending totals kept up to date as expenses are
+added or corrected, so summaries read day buckets instead of the history
+"""
+
+from datetime import date, timedelta
+
+class SpendingRollup:
+    """Materialized {day: {category: total}} buckets
+
+    ``add`` and ``remove`` touch one bucket. ``totals`` over a trailing
+    window walks the days in the window when that is fewer than the number
+    of buckets, and the buckets otherwise, so it never reads more than
+    min(N, days with spending) buckets.
+    """
+
+    def __init__(self, days=None):
+        self.days = days if days is not None else {}
+        # Running all-time total
+        self.total = sum(sum(bucket.values()) for bucket in self.days.values())
+
+    def add(self, expense_date, category, amount):
+        bucket = self.days.setdefault(expense_date, {})
+        bucket[category] = bucket.get(category, 0) + amount
+        self.total += amount
+
+    def remove(self, expense_date, category, amount):
+        bucket = self.days.get(expense_date, {})
+        remaining = bucket.get(category, 0) - amount
+        self.total -= amount
+        if abs(remaining) < 1e-9:
+            bucket.pop(category, None)
+            if not bucket:
+                self.days.pop(expense_date, None)
+        else:
+            bucket[category] = remaining
+
+    def add_expense(self, expense):
+        self.add(expense['date'], expense['category'], expense['amount'])
+
+    def remove_expense(self, expense):
+        self.remove(expense['date'], expense['category'], expense['amount'])
+
+    def totals(self, since=None, until=None):
+        """{category: total} for ISO dates in [since, until] (open ends allowed)"""
+        if since is not None and until is not None:
+            first, last = date.fromisoformat(since), date.fromisoformat(until)
+            n_days = (last - first).days + 1
+            if n_days < len(self.days):
+                buckets = (self.days.get((first + timedelta(days=i)).isoformat())
+                           for i in range(max(n_days, 0)))
+                return self._sum(b for b in buckets if b)
+        return self._sum(bucket for day, bucket in self.days.items()
+                         if (since is None or day >= since) and (until is None or day <= until))
+
+    @staticmethod
+    def _sum(buckets):
+        totals = {}
+        for bucket in buckets:
+            for category, amount in bucket.items():
+                totals[category] = totals.get(category, 0) + amount
+        return totals
+
+    @classmethod
+    def build(cls, expenses):
+        """Rebuild the rollup from raw expenses"""
+        rollup = cls()
+        for expense in expenses:
+            rollup.add_expense(expense)
+        return rollup
+
+    def diff(self, other, tolerance=1e-6):
+        """(day, category, mine, theirs) for every bucket that disagrees"""
+        mismatches = []
+        for day in sorted(set(self.days) | set(other.days)):
+            mine, theirs = self.days.get(day, {}), other.days.get(day, {})
+            for category in sorted(set(mine) | set(theirs)):
+                a, b = mine.get(category, 0), theirs.get(category, 0)
+                if abs(a - b) > tolerance:
+                    mismatches.append((day, category, a, b))
+        return mismatches
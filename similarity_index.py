@@ -0,0 +1,100 @@
+"""
+SIMILARITY INDEX
+Incrementally maintained inverted index over past transactions for fast
+top-k TF-IDF cosine lookups
+"""
+
+import heapq
+import math
+
+class SimilarityIndex:
+    """Inverted index with pruned TF-IDF cosine scoring
+
+    Documents are token lists (``ParsedTransaction.tokens``). Adding one
+    only touches the postings of its own terms. Queries walk the postings
+    of the query terms, rarest first, and skip terms so common they
+    carry almost no signal (their document frequency is above
+    ``max_df_ratio``). At most ``max_postings`` of the most recent
+    documents are read per term, so a query only touches a small slice of
+    the history however long it gets.
+
+    IDF is taken at query time. Document norms are recomputed whenever the
+    index doubles in size (amortized O(1) per add), so they never drift
+    far from the current IDF; scores are capped at 1.0.
+    """
+
+    def __init__(self, max_df_ratio=0.2, min_docs_for_pruning=100, max_postings=2000):
+        self.max_df_ratio = max_df_ratio
+        self.max_postings = max_postings
+        self.min_docs_for_pruning = min_docs_for_pruning
+        self.postings = {}
+        self.doc_terms = []
+        self.doc_norms = []
+        self._norms_refreshed_at = 0
+
+    def __len__(self):
+        return len(self.doc_norms)
+
+    def _idf(self, term):
+        df = len(self.postings.get(term, ()))
+        return math.log((1 + len(self.doc_norms)) / (1 + df)) + 1
+
+    @staticmethod
+    def _term_weights(tokens):
+        """Sublinear term frequencies of a token list"""
+        counts = {}
+        for token in tokens:
+            counts[token] = counts.get(token, 0) + 1
+        return {term: 1 + math.log(count) for term, count in counts.items()}
+
+    def _norm(self, weights):
+        return math.sqrt(sum((tf * self._idf(term)) ** 2 for term, tf in weights.items())) or 1.0
+
+    def add(self, tokens):
+        """Index a document; returns its id (ids are assigned in order)"""
+        doc_id = len(self.doc_norms)
+        weights = self._term_weights(tokens)
+        for term, tf in weights.items():
+            self.postings.setdefault(term, []).append((doc_id, tf))
+        self.doc_terms.append(weights)
+        self.doc_norms.append(self._norm(weights))
+
+        if len(self.doc_norms) >= 2 * self._norms_refreshed_at:
+            self.doc_norms = [self._norm(w) for w in self.doc_terms]
+            self._norms_refreshed_at = len(self.doc_norms)
+        return doc_id
+
+    def query(self, tokens, k=5):
+        """Top-k (doc_id, cosine score) pairs for a token list"""
+        weights = self._term_weights(tokens)
+        if not weights or not self.doc_norms:
+            return []
+
+        n_docs = len(self.doc_norms)
+        terms = sorted((t for t in weights if t in self.postings),
+                       key=lambda t: len(self.postings[t]))
+        if n_docs >= self.min_docs_for_pruning:
+            max_df = self.max_df_ratio * n_docs
+            rare = [t for t in terms if len(self.postings[t]) <= max_df]
+            # Keep the rarest term even if every query term is common
+            terms = rare or terms[:1]
+
+        query_norm = self._norm(weights)
+        scores = {}
+        for term in terms:
+            idf = self._idf(term)
+            query_weight = weights[term] * idf
+            for doc_id, tf in self.postings[term][-self.max_postings:]:
+                scores[doc_id] = scores.get(doc_id, 0.0) + query_weight * tf * idf
+
+        top = heapq.nlargest(k, scores.items(), key=lambda item: item[1] / self.doc_norms[item[0]])
+        return [(doc_id, min(score / (self.doc_norms[doc_id] * query_norm), 1.0))
+                for doc_id, score in top]
+
+    @classmethod
+    def build(cls, token_lists, **kwargs):
+        """Index existing documents in order"""
+        index = cls(**kwargs)
+        for tokens in token_lists:
+            index.add(tokens)
+        return index
@@ -3,97 +3,261 @@ SMART LIFE ASSISTANT
 Combines Expense Categorizer + AI Study Plan Agent
 """
 
-import pickle
-import re
-import json
+import argparse
+import math
+import sys
+import threading
+import time
 from datetime import datetime, timedelta
 
-# Import our modules
-try:
-    from predict import ExpensePredictor
-except:
-    print("Warning: Could not import ExpensePredictor")
+from anomaly import AnomalyDetector, state_path_for
+from budget_rules import DEFAULT_RULES_PATH, BudgetRuleEngine, load_rules
+from dedup import DuplicateDetector
+from similarity_index import SimilarityIndex
+from storage import open_store
+from transaction_parser import parse_transaction
 
-try:
-    from study_plan_agent import AIStudyPlanAgent
-except:
-    print("Warning: Could not import AIStudyPlanAgent")
+# The expense model (numpy, and sklearn for the pickle) and the study agent
+# are imported on first use, so the menu comes up without waiting for them
 
 
 class SmartLifeAssistant:
     """Unified assistant for expenses and study planning"""
     
-    def __init__(self):
-        try:
-            self.expense_predictor = ExpensePredictor()
-            print("✓ Expense Categorizer loaded")
-        except:
-            self.expense_predictor = None
-            print("✗ Expense Categorizer not available")
-        
-        self.study_agent = AIStudyPlanAgent()
-        print("✓ Study Plan Agent loaded")
-        
-        self.user_data = self._load_user_data()
+    def __init__(self, data_path='user_data.json', rules_path=DEFAULT_RULES_PATH):
+        """``data_path`` ending in .db selects the SQLite store
+
+        Budget rules for suggestions come from ``rules_path`` if it exists.
+        """
+        self._expense_predictor = None
+        self._predictor_loader = None
+        self._predictor_reported = False
+        self._study_agent = None
+        
+        self.online_learner = None
+        self.data_path = data_path
+        self.store = open_store(data_path)
+        self.user_data = self.store.data
+        self._similarity_index = None
+        self._duplicate_detector = None
+        self._analytics = None
+        self.rules_path = rules_path
+        self._budget_rules = None
+        self._anomaly_detector = None
     
-    def _load_user_data(self):
-        """Load user data from file"""
+    def start_background_load(self):
+        """Start loading the expense model in a background thread"""
+        if self._predictor_loader is None:
+            self._predictor_loader = threading.Thread(target=self._load_expense_predictor,
+                                                      daemon=True)
+            self._predictor_loader.start()
+    
+    def _load_expense_predictor(self):
         try:
-            with open('user_data.json', 'r') as f:
-                return json.load(f)
-        except:
-            return {
-                'expenses': [],
-                'study_plan': None,
-                'monthly_budget': 0,
-                'learning_budget': 0
-            }
+            from predict import HotReloadingPredictor
+            self._expense_predictor = HotReloadingPredictor(verbose=False)
+        except Exception:
+            self._expense_predictor = None
+    
+    @property
+    def expense_predictor(self):
+        """The expense model; waits for the background load if still running"""
+        self.start_background_load()
+        self._predictor_loader.join()
+        if not self._predictor_reported:
+            self._predictor_reported = True
+            if self._expense_predictor is None:
+                print("✗ Expense Categorizer not available")
+        return self._expense_predictor
+    
+    @property
+    def study_agent(self):
+        """The study plan agent, created on first use"""
+        if self._study_agent is None:
+            from study_plan_agent import AIStudyPlanAgent
+            self._study_agent = AIStudyPlanAgent()
+        return self._study_agent
+    
+    @property
+    def analytics(self):
+        """Weekly/monthly spending views, created on first use"""
+        if self._analytics is None:
+            from analytics import SpendingAnalytics
+            self._analytics = SpendingAnalytics(self.store)
+        return self._analytics
     
-    def _save_user_data(self):
-        """Save user data to file"""
-        with open('user_data.json', 'w') as f:
-            json.dump(self.user_data, f, indent=2)
+    @property
+    def budget_rules(self):
+        """The budget rule engine, compiled from the rules file on first use"""
+        if self._budget_rules is None:
+            self._budget_rules = BudgetRuleEngine(self.store, load_rules(self.rules_path))
+        return self._budget_rules
     
-    def add_expense(self, transaction_text, amount=None):
-        """Add and categorize an expense"""
+    def add_expense(self, transaction_text, amount=None, category=None, allow_duplicate=False):
+        """Add and categorize an expense
+        
+        Passing ``category`` records a user-chosen category instead of the
+        prediction and records it as a correction. Unless
+        ``allow_duplicate`` is set, an exact or near duplicate of a recent
+        expense is not added; the earlier expense is returned instead, with
+        a ``duplicate`` key of 'exact' or 'near'. An added expense that looks
+        unusual for its category is returned with an ``anomaly`` flag.
+        """
         if not self.expense_predictor:
             return None
         
-        result = self.expense_predictor.predict_category(transaction_text)
+        parsed = parse_transaction(transaction_text)
         
         # Extract amount if not provided
         if amount is None:
-            numbers = re.findall(r'\d+', transaction_text)
-            amount = int(numbers[0]) if numbers else 0
+            amount = parsed.amount
+        
+        today = datetime.now().strftime('%Y-%m-%d')
+        if not allow_duplicate:
+            self.duplicate_detector.sync(self.user_data['expenses'])
+            duplicate = self.duplicate_detector.check(today, transaction_text, amount)
+            if duplicate is not None:
+                kind, index = duplicate
+                return dict(self.user_data['expenses'][index], duplicate=kind)
+        
+        history_match = self._history_match(parsed)
+        if category is None and history_match is not None:
+            result = history_match
+        elif category is None:
+            result = self.expense_predictor.predict_parsed(parsed)
+        else:
+            result = {'category': category, 'confidence': 100.0}
+            self._learn_correction(transaction_text, category)
         
         expense = {
-            'date': datetime.now().strftime('%Y-%m-%d'),
+            'date': today,
             'transaction': transaction_text,
             'amount': amount,
             'category': result['category'],
             'confidence': result['confidence']
         }
         
-        self.user_data['expenses'].append(expense)
-        self._save_user_data()
-        
+        # Loaded before the add, so the new expense is scored against history
+        anomaly_detector = self.anomaly_detector
+        index = self.store.add_expense(expense)
+        self._sync_similarity_index()
+        self.duplicate_detector.sync(self.user_data['expenses'])
+        
+        # Also folds in anything other sessions added meanwhile
+        flags = anomaly_detector.sync(self.user_data['expenses'])
+        flag = next((f for f in flags if f['transaction'] == transaction_text and f['date'] == today), None)
+        if flag is not None:
+            return dict(expense, anomaly=flag)
         return expense
     
+    @property
+    def duplicate_detector(self):
+        """Exact/near duplicate detector over stored expenses, built on first use"""
+        if self._duplicate_detector is None:
+            self._duplicate_detector = DuplicateDetector.build(self.user_data['expenses'])
+        return self._duplicate_detector
+    
+    @property
+    def anomaly_detector(self):
+        """Per-category spending statistics, resumed from their saved state on first use"""
+        if self._anomaly_detector is None:
+            self._anomaly_detector = AnomalyDetector.load_or_build(
+                state_path_for(self.data_path), self.user_data['expenses'])
+        return self._anomaly_detector
+    
+    @property
+    def similarity_index(self):
+        """Inverted index over past transactions, built on first use
+        
+        Document ids are positions in ``user_data['expenses']``; see
+        ``_sync_similarity_index``.
+        """
+        if self._similarity_index is None:
+            self._similarity_index = SimilarityIndex.build(
+                parse_transaction(e['transaction']).tokens for e in self.user_data['expenses']
+            )
+        return self._similarity_index
+    
+    def _sync_similarity_index(self):
+        """Index the expenses appended since the index last looked
+        
+        The store also appends expenses other sessions and imports added,
+        so the index catches up with the store's list in order rather than
+        adding only this session's expenses; doc ids stay store positions.
+        """
+        index = self.similarity_index
+        expenses = self.user_data['expenses']
+        if len(index) > len(expenses):
+            # The store was replaced with a shorter history
+            self._similarity_index = None
+            return
+        for expense in expenses[len(index):]:
+            index.add(parse_transaction(expense['transaction']).tokens)
+    
+    def find_similar_expenses(self, transaction_text, k=5):
+        """Most similar past expenses as (expense, score) pairs"""
+        self._sync_similarity_index()
+        tokens = parse_transaction(transaction_text).tokens
+        return [(self.user_data['expenses'][doc_id], score)
+                for doc_id, score in self.similarity_index.query(tokens, k)]
+    
+    def _history_match(self, parsed, threshold=0.95):
+        """Reuse the category of a near-identical past transaction"""
+        self._sync_similarity_index()
+        matches = self.similarity_index.query(parsed.tokens, k=1)
+        if not matches or matches[0][1] < threshold:
+            return None
+        doc_id, score = matches[0]
+        return {
+            'category': self.user_data['expenses'][doc_id]['category'],
+            'confidence': score * 100,
+            'source': 'history'
+        }
+    
+    def import_statement(self, path, **options):
+        """Import a CSV/OFX bank statement; see statement_import.import_statement"""
+        if not self.expense_predictor:
+            return None
+        from statement_import import import_statement
+        # The similarity index and duplicate detector catch up with the
+        # imported expenses on their next use
+        return import_statement(path, self.store, self.expense_predictor, **options)
+    
+    def correct_expense(self, index, category):
+        """Fix the category of a stored expense and learn from it"""
+        expense = dict(self.user_data['expenses'][index])
+        self._learn_correction(expense['transaction'], category)
+        # Moves the amount to the new category's statistics
+        self.anomaly_detector.move(index % len(self.user_data['expenses']), expense, category)
+        return self.store.update_expense(index, category=category, confidence=100.0)
+    
+    def _learn_correction(self, transaction_text, category):
+        """Record a corrected category and fold it into the incremental model
+        
+        The correction is answered ahead of the model from the next
+        categorization of the same text on. The online model generalizes it
+        to similar texts once it is served (``load_predictor``'s
+        ``online_path``) or used to retrain.
+        """
+        from predict import CORRECTIONS_PATH, CorrectionOverlay
+        predictor = self._expense_predictor.predictor if self._expense_predictor else None
+        corrections = (predictor.corrections if predictor is not None and predictor.corrections is not None
+                       else CorrectionOverlay(CORRECTIONS_PATH))
+        corrections.add(parse_transaction(transaction_text).text, category)
+        
+        if self.online_learner is None:
+            # Imported here so sklearn is only loaded once a correction arrives
+            from train_model import OnlineExpenseCategorizer
+            self.online_learner = OnlineExpenseCategorizer.load_or_create()
+        self.online_learner.learn_one(transaction_text, category)
+    
     def get_spending_summary(self, days=30):
         """Get spending summary for last N days"""
-        cutoff_date = datetime.now() - timedelta(days=days)
-        
-        summary = {}
-        total = 0
-        
-        for expense in self.user_data['expenses']:
-            exp_date = datetime.strptime(expense['date'], '%Y-%m-%d')
-            if exp_date >= cutoff_date:
-                category = expense['category']
-                amount = expense['amount']
-                
-                summary[category] = summary.get(category, 0) + amount
-                total += amount
+        # The last N days including today, read from the store's day rollup
+        today = datetime.now()
+        since = (today - timedelta(days=days - 1)).strftime('%Y-%m-%d')
+        summary = self.store.spending_by_category(since, today.strftime('%Y-%m-%d'))
+        total = sum(summary.values())
         
         return {
             'total_spent': total,
@@ -102,44 +266,27 @@ class SmartLifeAssistant:
         }
     
     def get_smart_suggestions(self):
-        """Get AI suggestions based on expenses and study plan"""
+        """Get AI suggestions based on expenses and study plan
+        
+        Unusual expenses of the last week come first ('anomaly'). Spending
+        suggestions come from the budget rules, which re-evaluate only when
+        the spending they read has changed.
+        """
         
-        summary = self.get_spending_summary(30)
         suggestions = []
         
-        # Analyze spending patterns
-        if summary['total_spent'] > 0:
-            by_category = summary['by_category']
-            
-            # Check food spending
-            food_spent = by_category.get('Food', 0)
-            if food_spent > 8000:
-                suggestions.append({
-                    'type': 'expense',
-                    'category': 'Food',
-                    'message': f"💰 You spent ₹{food_spent} on food this month. Consider meal prep to save money!",
-                    'action': 'Learn cooking basics or use budget meal planning'
-                })
-            
-            # Check education spending
-            edu_spent = by_category.get('Education', 0)
-            if edu_spent > 5000:
-                suggestions.append({
-                    'type': 'learning',
-                    'category': 'Education',
-                    'message': f"📚 You invested ₹{edu_spent} in education! Create a study plan to maximize your learning.",
-                    'action': 'Use the AI Study Plan Agent to structure your learning'
-                })
-            
-            # Check entertainment vs education
-            entertainment = by_category.get('Entertainment', 0)
-            education = by_category.get('Education', 0)
-            if entertainment > education * 2 and education > 0:
-                suggestions.append({
-                    'type': 'balance',
-                    'message': f"⚖️ Entertainment (₹{entertainment}) > Education (₹{education}). Consider balancing your investments!",
-                    'action': 'Redirect some entertainment budget to skill development'
-                })
+        # Unusual expenses from the last week, including imported ones
+        self.anomaly_detector.sync(self.user_data['expenses'])
+        for flag in self.anomaly_detector.recent_flags(7)[:3]:
+            suggestions.append({
+                'type': 'anomaly',
+                'category': flag['category'],
+                'message': f"🚨 Unusual expense on {flag['date']}: '{flag['transaction']}' "
+                           f"(₹{flag['amount']}). {flag['reasons'][0]}.",
+                'action': 'Check it is correct, or fix its category if it was misfiled'
+            })
+        
+        suggestions.extend(self.budget_rules.suggestions())
         
         # Study plan suggestions
         if self.user_data.get('study_plan') is None:
@@ -167,6 +314,9 @@ class SmartLifeAssistant:
     def main_menu(self):
         """Interactive main menu"""
         
+        # The model loads while the user reads the menu
+        self.start_background_load()
+        
         while True:
             print("\n" + "=" * 70)
             print("🌟 SMART LIFE ASSISTANT")
@@ -177,10 +327,11 @@ class SmartLifeAssistant:
             print("4. 📅 Today's Study Tasks")
             print("5. 💡 Get Smart Suggestions")
             print("6. 📈 Full Dashboard")
-            print("7. 🚪 Exit")
+            print("7. 📥 Import Bank Statement")
+            print("8. 🚪 Exit")
             print("=" * 70)
             
-            choice = input("\nEnter your choice (1-7): ").strip()
+            choice = input("\nEnter your choice (1-8): ").strip()
             
             if choice == '1':
                 self._add_expense_interactive()
@@ -195,6 +346,16 @@ class SmartLifeAssistant:
             elif choice == '6':
                 self._show_dashboard()
             elif choice == '7':
+                self._import_statement_interactive()
+            elif choice == '8':
+                if self.online_learner and self.online_learner.pending_updates:
+                    self.online_learner.checkpoint()
+                if self._anomaly_detector and self._anomaly_detector.stale:
+                    # Corrections left the recent-spending statistics behind
+                    self._anomaly_detector.rebuild(self.user_data['expenses'])
+                if self._anomaly_detector and self._anomaly_detector.pending_updates:
+                    self._anomaly_detector.checkpoint()
+                self.store.compact()
                 print("\n👋 Goodbye! Keep learning and spending wisely!")
                 break
             else:
@@ -212,13 +373,57 @@ class SmartLifeAssistant:
             print("Empty transaction!")
             return
         
+        similar = self.find_similar_expenses(transaction, k=3)
         expense = self.add_expense(transaction)
         
+        if expense and expense.get('duplicate'):
+            print(f"\n⚠️ Looks like a {expense['duplicate']} duplicate of "
+                  f"'{expense['transaction']}' (₹{expense['amount']}) from {expense['date']}")
+            if input("Add it anyway? (yes/no): ").strip().lower() not in ['yes', 'y']:
+                return
+            expense = self.add_expense(transaction, allow_duplicate=True)
+        
         if expense:
             print(f"\n✓ Expense added!")
             print(f"  Category: {expense['category']}")
             print(f"  Amount: ₹{expense['amount']}")
             print(f"  Confidence: {expense['confidence']:.1f}%")
+            
+            if expense.get('anomaly'):
+                print(f"\n  🚨 Unusual: {'; '.join(expense['anomaly']['reasons'])}")
+            
+            if similar:
+                print("\n  Similar past transactions:")
+                for past, score in similar:
+                    print(f"    • {past['transaction']} → {past['category']} ({score * 100:.0f}% match)")
+            
+            correction = input("\nPress Enter to keep, or type the correct category: ").strip()
+            if correction and correction != expense['category']:
+                try:
+                    self.correct_expense(len(self.user_data['expenses']) - 1, correction)
+                    print(f"✓ Category corrected to {correction}")
+                except ValueError:
+                    print(f"✗ Unknown category: {correction}")
+    
+    def _import_statement_interactive(self):
+        """Interactive statement import"""
+        print("\n" + "=" * 70)
+        print("📥 IMPORT BANK STATEMENT")
+        print("=" * 70)
+        
+        path = input("\nStatement file (CSV or OFX): ").strip().strip('"')
+        if not path:
+            return
+        
+        try:
+            report = self.import_statement(path)
+        except (OSError, ValueError) as e:
+            print(f"✗ Could not import {path}: {e}")
+            return
+        
+        if report:
+            from statement_import import print_import_report
+            print_import_report(report)
     
     def _view_spending_summary(self):
         """View spending summary"""
@@ -255,8 +460,7 @@ class SmartLifeAssistant:
         # Create new plan
         plan = self.study_agent.interactive_plan_creator()
         if plan:
-            self.user_data['study_plan'] = plan
-            self._save_user_data()
+            self.store.set('study_plan', plan)
     
     def _show_today_tasks(self):
         """Show today's study tasks"""
@@ -300,6 +504,22 @@ class SmartLifeAssistant:
         for category, amount in top_3:
             print(f"    • {category}: ₹{amount:,}")
         
+        # Trends section, from the cached monthly views
+        print("\n📈 TRENDS:")
+        this_month = self.analytics.month_over_month(1).iloc[-1]
+        print(f"  This month: ₹{this_month['total']:,.0f}", end="")
+        if not math.isnan(this_month['pct_change']):
+            print(f" ({this_month['pct_change']:+.1f}% vs last month)")
+        else:
+            print()
+        trends = self.analytics.category_trends(6)
+        moving = trends[trends['trend'] != 'flat']
+        for category, row in moving.head(3).iterrows():
+            arrow = "↑" if row['trend'] == 'rising' else "↓"
+            print(f"  {arrow} {category}: {row['pct_per_month']:+.1f}%/month over 6 months")
+        if moving.empty:
+            print("  No category changed much over the last 6 months")
+        
         # Study section
         print("\n🎓 LEARNING:")
         if self.user_data.get('study_plan'):
@@ -327,8 +547,60 @@ class SmartLifeAssistant:
 # MAIN EXECUTION
 # ========================
 
+def startup_report(data_path='user_data.json'):
+    """Print where startup time goes: imports, construction and model load"""
+    import subprocess
+    
+    # Per-module import cost, from a fresh interpreter. importtime lists
+    # children (indented one level deeper) before the module importing them.
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import smart_life_assistant'],
+                            capture_output=True, text=True)
+    children, imports, total_us = [], [], 0
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        if depth == 1:
+            children.append((int(cumulative_us), int(self_us), name.strip()))
+        elif depth == 0:
+            if name.strip() == 'smart_life_assistant':
+                imports, total_us = children, int(cumulative_us)
+            children = []
+    imports.sort(reverse=True)
+    
+    start = time.perf_counter()
+    assistant = SmartLifeAssistant(data_path)
+    constructed = time.perf_counter()
+    assistant.start_background_load()
+    menu_ready = time.perf_counter()
+    assistant.expense_predictor
+    model_ready = time.perf_counter()
+    
+    print("=" * 70)
+    print("⏱️ STARTUP REPORT")
+    print("=" * 70)
+    print(f"Import smart_life_assistant:  {total_us / 1000:8.1f} ms")
+    for cumulative_us, self_us, name in imports[:10]:
+        print(f"  {name:28s} {cumulative_us / 1000:8.1f} ms (self {self_us / 1000:.1f} ms)")
+    print(f"Construct assistant:          {(constructed - start) * 1000:8.1f} ms")
+    print(f"Until menu is shown:          {(menu_ready - start) * 1000:8.1f} ms")
+    print(f"Expense model ready (bg):     {(model_ready - start) * 1000:8.1f} ms")
+
 if __name__ == "__main__":
-    print("\n🚀 Initializing Smart Life Assistant...")
+    parser = argparse.ArgumentParser(description="Smart Life Assistant")
+    parser.add_argument('--data', default='user_data.json',
+                        help="User data file; use a .db path for the SQLite store")
+    parser.add_argument('--rules', default=DEFAULT_RULES_PATH,
+                        help="Budget rules file for suggestions (defaults apply if missing)")
+    parser.add_argument('--startup-report', action='store_true',
+                        help="Report where startup time goes and exit")
+    args = parser.parse_args()
     
-    assistant = SmartLifeAssistant()
-    assistant.main_menu()
\ No newline at end of file
+    if args.startup_report:
+        startup_report(args.data)
+    else:
+        print("\n🚀 Initializing Smart Life Assistant...")
+        
+        assistant = SmartLifeAssistant(args.data, args.rules)
+        assistant.main_menu()
\ No newline at end of file
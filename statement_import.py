@@ -0,0 +1,373 @@
+"""
+STATEMENT IMPORT
+Streams CSV and OFX bank statements, categorizes them in batches and
+commits every imported expense to storage in one write
+"""
+
+import argparse
+import csv
+import os
+import re
+import time
+from datetime import datetime
+from typing import NamedTuple, Union
+
+from dedup import DuplicateDetector
+from transaction_parser import parse_amount, parse_transaction
+
+# ========================
+# 1. ROW NORMALIZATION
+# ========================
+
+class RowError(Exception):
+    """A statement row that cannot be imported; goes to the reject file"""
+
+class StatementRow(NamedTuple):
+    date: str
+    text: str
+    amount: Union[int, float]
+
+# Day-first formats come first: a date like 03/04/2025 is read as 3 April
+DATE_FORMATS = [
+    '%Y-%m-%d', '%d/%m/%Y', '%d-%m-%Y', '%d.%m.%Y', '%d/%m/%y', '%d-%m-%y',
+    '%d %b %Y', '%d-%b-%Y', '%d %b %y', '%d-%b-%y', '%Y/%m/%d', '%m/%d/%Y', '%Y%m%d'
+]
+
+_MONEY_JUNK = re.compile(r'[₹$€£,\s]|inr|rs\.?', re.IGNORECASE)
+_DR_CR_MARKER = re.compile(r'(dr|cr)\.?\s*$', re.IGNORECASE)
+
+# Statements repeat the same few hundred dates, so parsed ones are cached
+_DATE_CACHE = {}
+
+def parse_date(value):
+    """ISO date of a statement date string; raises RowError if unrecognized"""
+    iso = _DATE_CACHE.get(value)
+    if iso is not None:
+        return iso
+    text = value.strip()
+    # OFX timestamps: YYYYMMDD[HHMMSS[.XXX]][[offset:TZ]]
+    if re.fullmatch(r'\d{8}(\d{6}(\.\d+)?)?(\[.*\])?', text):
+        text = text[:8]
+    for fmt in DATE_FORMATS:
+        try:
+            iso = datetime.strptime(text, fmt).strftime('%Y-%m-%d')
+            break
+        except ValueError:
+            continue
+    else:
+        raise RowError(f"Unrecognized date: {value!r}")
+    if len(_DATE_CACHE) < 10000:
+        _DATE_CACHE[value] = iso
+    return iso
+
+def parse_money(value):
+    """Signed amount of a statement money string, or None if blank"""
+    text = _MONEY_JUNK.sub('', value or '')
+    if not text:
+        return None
+    sign = 1
+    marker = _DR_CR_MARKER.search(text)
+    if marker:
+        # Trailing Dr/Cr markers: Dr is money going out
+        sign = -1 if marker.group(1).lower() == 'dr' else 1
+        text = text[:marker.start()]
+    if text.startswith('(') and text.endswith(')'):
+        sign, text = -sign, text[1:-1]
+    if text.startswith(('-', '+')):
+        sign, text = (-1 if text[0] == '-' else 1) * sign, text[1:]
+    if not re.fullmatch(r'\d+(\.\d+)?', text):
+        raise RowError(f"Unrecognized amount: {value!r}")
+    return sign * parse_amount(text)
+
+def normalize_row(fields, signed_amounts=False):
+    """Turn a statement row's raw fields into a StatementRow
+
+    Returns None for rows that are not spending (credits and deposits).
+    With separate debit/credit columns the debit is used. With a single
+    amount column, every row is spending unless ``signed_amounts`` is set,
+    in which case negative amounts are spending and positive ones credits
+    (amounts marked Dr/Cr are always read that way).
+    """
+    text = (fields.get('text') or '').strip()
+    if not text:
+        raise RowError("Missing description")
+    date = parse_date(fields.get('date') or '')
+
+    kind = (fields.get('type') or '').strip().lower()
+    if kind in ('cr', 'credit', 'dep', 'deposit', 'int', 'div'):
+        return None
+
+    if 'debit' in fields:
+        amount = parse_money(fields['debit'])
+        if not amount:
+            if parse_money(fields.get('credit')):
+                return None
+            raise RowError("Missing amount")
+        return StatementRow(date, text, abs(amount))
+
+    amount = parse_money(fields.get('amount'))
+    if amount is None:
+        raise RowError("Missing amount")
+    # A Dr/Cr marker makes the sign meaningful even in unsigned statements
+    if (signed_amounts or _DR_CR_MARKER.search(fields['amount'])) and amount > 0:
+        return None
+    return StatementRow(date, text, abs(amount))
+
+# ========================
+# 2. STATEMENT READERS
+# ========================
+
+# Normalized header name -> field, for the column layouts banks commonly export
+CSV_COLUMNS = {
+    'date': ('date', 'transaction date', 'txn date', 'posting date', 'value date', 'value dt'),
+    'text': ('description', 'narration', 'transaction', 'details', 'particulars', 'memo',
+             'name', 'remarks', 'transaction details'),
+    'amount': ('amount', 'transaction amount', 'amt'),
+    'debit': ('debit', 'withdrawal', 'withdrawal amt', 'withdrawal amount', 'debit amount'),
+    'credit': ('credit', 'deposit', 'deposit amt', 'deposit amount', 'credit amount'),
+    'type': ('type', 'dr/cr', 'cr/dr', 'transaction type', 'debit/credit')
+}
+
+def _normalize_header(name):
+    return ' '.join(re.sub(r'[^a-z/ ]', ' ', name.lower()).split())
+
+def iter_csv(path):
+    """Yield (line number, raw values, fields) for each CSV data row"""
+    with open(path, newline='', encoding='utf-8-sig') as f:
+        reader = csv.reader(f)
+        header = next(reader, None)
+        if header is None:
+            return
+        positions = {}
+        names = [_normalize_header(h) for h in header]
+        for field, aliases in CSV_COLUMNS.items():
+            # First alias present wins, so 'transaction date' beats 'value date'
+            for alias in aliases:
+                if alias in names and names.index(alias) not in positions.values():
+                    positions[field] = names.index(alias)
+                    break
+        if 'date' not in positions or 'text' not in positions or not (
+                'amount' in positions or 'debit' in positions):
+            raise ValueError(f"{path}: need date, description and amount (or debit) columns, "
+                             f"got {header}")
+
+        for values in reader:
+            if not any(v.strip() for v in values):
+                continue
+            fields = {field: values[i] if i < len(values) else ''
+                      for field, i in positions.items()}
+            yield reader.line_num, values, fields
+
+_OFX_TAG = re.compile(r'<(/?)([A-Za-z0-9.]+)>([^<]*)')
+
+def iter_ofx(path, chunk_size=1 << 16):
+    """Yield (transaction number, raw text, fields) for each OFX STMTTRN
+
+    Handles both SGML (OFX 1.x, unclosed value tags) and XML (OFX 2.x)
+    files, reading them in chunks.
+    """
+    count = 0
+    current = None
+    buffer = ''
+    with open(path, encoding='utf-8', errors='replace') as f:
+        while True:
+            chunk = f.read(chunk_size)
+            buffer += chunk
+            # Keep a possibly incomplete last tag for the next round
+            cut = max(buffer.rfind('<'), 0) if chunk else len(buffer)
+            for match in _OFX_TAG.finditer(buffer, 0, cut):
+                closing, tag, value = match.group(1), match.group(2).upper(), match.group(3).strip()
+                if tag == 'STMTTRN':
+                    if not closing:
+                        current = {}
+                    elif current is not None:
+                        count += 1
+                        yield count, [f"{k}={v}" for k, v in current.items()], {
+                            'date': current.get('DTPOSTED', ''),
+                            'text': ' '.join(filter(None, [current.get('NAME'),
+                                                           current.get('MEMO')])),
+                            'amount': current.get('TRNAMT', ''),
+                            'type': current.get('TRNTYPE', '')
+                        }
+                        current = None
+                elif current is not None and not closing and value:
+                    current[tag] = value
+            buffer = buffer[cut:]
+            if not chunk:
+                break
+
+def _is_ofx(path):
+    return path.lower().endswith(('.ofx', '.qfx'))
+
+def iter_statement(path):
+    """Raw rows of a CSV or OFX statement"""
+    return iter_ofx(path) if _is_ofx(path) else iter_csv(path)
+
+# ========================
+# 3. IMPORT
+# ========================
+
+class _StoredFingerprints:
+    """Exact-duplicate lookup against stored expenses, built per date on demand
+
+    Only the dates a statement touches are read (``store.expenses_on``)
+    and fingerprinted, so checking a small statement against a long
+    history stays cheap.
+    """
+
+    def __init__(self, store):
+        self.store = store
+        self._fingerprints = {}
+
+    @staticmethod
+    def _fingerprint(expense_date, transaction_text, amount):
+        return DuplicateDetector.fingerprint(expense_date, parse_transaction(transaction_text).text,
+                                             amount)
+
+    def __contains__(self, row):
+        fingerprints = self._fingerprints.get(row.date)
+        if fingerprints is None:
+            fingerprints = self._fingerprints[row.date] = {
+                self._fingerprint(e['date'], e['transaction'], e['amount'])
+                for e in self.store.expenses_on(row.date)
+            }
+        return self._fingerprint(row.date, row.text, row.amount) in fingerprints
+
+class _Rejects:
+    """Reject file, created on the first rejected row"""
+
+    def __init__(self, path):
+        self.path = path
+        self.count = 0
+        self._file = None
+        self._writer = None
+
+    def add(self, line, reason, raw):
+        if self._writer is None:
+            self._file = open(self.path, 'w', newline='', encoding='utf-8')
+            self._writer = csv.writer(self._file)
+            self._writer.writerow(['line', 'reason', 'row'])
+        self._writer.writerow([line, reason] + list(raw))
+        self.count += 1
+
+    def close(self):
+        if self._file:
+            self._file.close()
+
+def import_statement(path, store, predictor, batch_size=2000, reject_path=None,
+                     signed_amounts=False, skip_duplicates=True, progress=True):
+    """Import a statement into ``store``; returns a report dict
+
+    Rows are read as a stream and categorized ``batch_size`` at a time
+    with ``predictor.predict_batch``. All imported expenses are written
+    with a single ``store.add_expenses`` call at the end, so an import
+    either lands completely or not at all. Rows that cannot be parsed go
+    to ``reject_path`` (default ``<statement>.rejects.csv``). Unless
+    ``skip_duplicates`` is off, rows exactly matching an expense already
+    stored (same date, normalized text and amount) are skipped, so
+    importing the same statement twice adds nothing. Repeated rows within
+    one statement are kept: they are usually genuine repeat purchases.
+    """
+    start = time.perf_counter()
+    reject_path = reject_path or os.path.splitext(path)[0] + '.rejects.csv'
+    rejects = _Rejects(reject_path)
+    stored = _StoredFingerprints(store) if skip_duplicates else None
+    force_signed = signed_amounts or _is_ofx(path)
+
+    expenses = []
+    rows = credits = duplicates = 0
+    batch = []
+
+    def flush():
+        results = predictor.predict_batch([row.text for row in batch])
+        for row, result in zip(batch, results):
+            expenses.append({
+                'date': row.date,
+                'transaction': row.text,
+                'amount': row.amount,
+                'category': result['category'],
+                'confidence': result['confidence']
+            })
+        batch.clear()
+        if progress:
+            elapsed = time.perf_counter() - start
+            print(f"  {rows:,} rows read, {len(expenses):,} categorized "
+                  f"({rows / elapsed if elapsed else 0:,.0f} rows/s)")
+
+    try:
+        for line, raw, fields in iter_statement(path):
+            rows += 1
+            try:
+                row = normalize_row(fields, force_signed)
+            except RowError as e:
+                rejects.add(line, str(e), raw)
+                continue
+            if row is None:
+                credits += 1
+                continue
+            if stored is not None and row in stored:
+                duplicates += 1
+                continue
+            batch.append(row)
+            if len(batch) >= batch_size:
+                flush()
+        if batch:
+            flush()
+    finally:
+        rejects.close()
+
+    store.add_expenses(expenses)
+    elapsed = time.perf_counter() - start
+    return {
+        'rows': rows,
+        'imported': len(expenses),
+        'credits_skipped': credits,
+        'duplicates_skipped': duplicates,
+        'rejected': rejects.count,
+        'reject_path': reject_path if rejects.count else None,
+        'seconds': elapsed
+    }
+
+def print_import_report(report):
+    print(f"\n✓ Imported {report['imported']:,} of {report['rows']:,} rows "
+          f"in {report['seconds']:.1f}s")
+    if report['credits_skipped']:
+        print(f"  Skipped {report['credits_skipped']:,} credits/deposits")
+    if report['duplicates_skipped']:
+        print(f"  Skipped {report['duplicates_skipped']:,} already imported")
+    if report['rejected']:
+        print(f"  ✗ {report['rejected']:,} rows could not be read; see {report['reject_path']}")
+
+# ========================
+# MAIN EXECUTION
+# ========================
+
+def main(argv=None):
+    from predict import load_predictor
+    from storage import ShardedStore, open_store
+
+    parser = argparse.ArgumentParser(description="Import a CSV or OFX bank statement")
+    parser.add_argument('statement', help="CSV, OFX or QFX file")
+    parser.add_argument('--data', default='user_data.json',
+                        help="User data file; a .db path selects the SQLite store")
+    parser.add_argument('--user', help="Import into this user's shard under --root instead")
+    parser.add_argument('--root', default='user_data')
+    parser.add_argument('--batch-size', type=int, default=2000)
+    parser.add_argument('--rejects', help="Reject file (default: <statement>.rejects.csv)")
+    parser.add_argument('--signed', action='store_true',
+                        help="CSV amounts are signed: only negative amounts are spending")
+    parser.add_argument('--allow-duplicates', action='store_true',
+                        help="Import rows even if they match stored expenses")
+    args = parser.parse_args(argv)
+
+    store = ShardedStore(args.root).for_user(args.user) if args.user else open_store(args.data)
+    print("=" * 60)
+    print("STATEMENT IMPORT")
+    print("=" * 60)
+    report = import_statement(args.statement, store, load_predictor(verbose=False),
+                              args.batch_size, args.rejects, args.signed,
+                              not args.allow_duplicates)
+    print_import_report(report)
+
+if __name__ == "__main__":
+    main()
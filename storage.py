@@ -0,0 +1,774 @@
+"""
+USER DATA STORAGE
+Two interchangeable backends for the assistant's user data: an append-only
+JSONL journal with snapshot compaction, and an indexed SQLite database that
+answers spending summaries with range queries
+"""
+
+import argparse
+import bisect
+import hashlib
+import json
+import os
+import sqlite3
+from collections.abc import Sequence
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:
+    # No advisory locks (Windows): one writer per user at a time
+    fcntl = None
+
+from rollups import SpendingRollup
+
+DEFAULT_USER_DATA = {
+    'expenses': [],
+    'study_plan': None,
+    'monthly_budget': 0,
+    'learning_budget': 0
+}
+
+# Snapshot keys holding the sequence number of the last journal record
+# folded in, and the spending rollup as of that record
+_SEQ_KEY = '_journal_seq'
+_ROLLUP_KEY = '_rollup'
+
+def _fsync_dir(path):
+    """Persist a rename in the directory holding ``path`` (no-op where unsupported)"""
+    try:
+        fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+@contextmanager
+def _file_lock(path, exclusive):
+    """Hold an advisory lock on ``path`` (created if missing)"""
+    if fcntl is None:
+        yield
+        return
+    with open(path, 'a') as f:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        try:
+            yield
+        finally:
+            fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+def _file_stamp(path):
+    """Identity of a file's current version; changes whenever it is replaced"""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_ino, st.st_mtime_ns, st.st_size
+
+class _ChangeNotifier:
+    """Lets views subscribe to the days whose spending changed"""
+
+    def subscribe(self, callback):
+        """Call ``callback(days)`` after changes; ``days`` is None if unknown (reload)"""
+        self._listeners.append(callback)
+
+    def _notify(self, days):
+        for callback in self._listeners:
+            callback(days)
+
+class JournalStore(_ChangeNotifier):
+    """User data as a snapshot plus a journal of changes since it was taken
+
+    Every change is appended to ``journal_path`` as one JSON line carrying
+    a sequence number, then flushed and fsync'd. Loading reads the snapshot
+    and replays only journal records newer than the sequence number stored
+    in it, so a crash between writing a snapshot and truncating the journal
+    never applies a change twice. A torn last line (a crash mid-append) is
+    dropped and cut off the journal.
+
+    Once the journal holds ``compact_every`` changes (a batch counts each
+    of its expenses) it is folded into a new snapshot, written to a
+    temporary file and renamed into place.
+
+    ``rollup`` holds per-day category totals. It is saved in the snapshot
+    and kept current by every journaled change, so it is never rebuilt
+    from the history unless the snapshot predates it. An index of expense
+    positions by date is built on the first ``expenses_on`` call and kept
+    current the same way.
+
+    Several processes may share a store. Reads take a shared lock on
+    ``<name>.lock`` and writes an exclusive one; before writing, a store
+    first applies the records other processes appended since it last
+    looked (or reloads, if one of them compacted), so sequence numbers
+    never collide and no change is lost.
+
+    The store owns ``data``: callers read it freely but change it only
+    through ``add_expense``, ``update_expense`` and ``set``.
+    """
+
+    def __init__(self, snapshot_path='user_data.json', journal_path=None, compact_every=500):
+        self.snapshot_path = snapshot_path
+        self.journal_path = journal_path or os.path.splitext(snapshot_path)[0] + '.journal'
+        self.lock_path = os.path.splitext(snapshot_path)[0] + '.lock'
+        self.compact_every = compact_every
+        self.seq = 0
+        self.journal_records = 0
+        self.rollup = None
+        self._date_index = None
+        # Snapshot version and journal bytes already reflected in ``data``
+        self._snapshot_stamp = None
+        self._journal_offset = 0
+        self._listeners = []
+        self.data = self.load()
+
+    # ========================
+    # LOADING AND RECOVERY
+    # ========================
+
+    def load(self):
+        """Read the snapshot and replay the journal tail"""
+        with _file_lock(self.lock_path, exclusive=False):
+            data = self._read_snapshot()
+            self._replay(data)
+        return data
+
+    def _read_snapshot(self):
+        self._snapshot_stamp = _file_stamp(self.snapshot_path)
+        try:
+            with open(self.snapshot_path, 'r') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            data = json.loads(json.dumps(DEFAULT_USER_DATA))
+        for key, value in DEFAULT_USER_DATA.items():
+            data.setdefault(key, json.loads(json.dumps(value)))
+        self.seq = data.pop(_SEQ_KEY, 0)
+        rollup_days = data.pop(_ROLLUP_KEY, None)
+        self.rollup = (SpendingRollup(rollup_days) if rollup_days is not None
+                       else SpendingRollup.build(data['expenses']))
+        self._date_index = None
+        self.journal_records = 0
+        self._journal_offset = 0
+        return data
+
+    def _replay(self, data, touched=None):
+        """Apply journal records past the read offset; True if a torn line follows them
+
+        Days whose spending changed are added to ``touched``.
+        """
+        if not os.path.exists(self.journal_path):
+            return False
+        with open(self.journal_path, 'rb') as f:
+            f.seek(self._journal_offset)
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    break
+                if not line.endswith(b'\n'):
+                    # Complete JSON but the append never finished
+                    break
+                self._journal_offset += len(line)
+                self.journal_records += len(record.get('expenses', ())) or 1
+                if record['seq'] > self.seq:
+                    days = self._apply(data, record)
+                    if touched is not None:
+                        touched.update(days)
+                    self.seq = record['seq']
+        return self._journal_offset < os.path.getsize(self.journal_path)
+
+    def _catch_up(self, repair=True):
+        """Bring ``data`` up to date with other writers
+
+        ``repair`` cuts off a torn journal line, and needs the exclusive lock.
+        """
+        touched = set()
+        if _file_stamp(self.snapshot_path) != self._snapshot_stamp:
+            # Compacted elsewhere: reload, keeping the same dict for callers
+            fresh = self._read_snapshot()
+            self.data.clear()
+            self.data.update(fresh)
+            touched = None
+        torn = self._replay(self.data, touched)
+        if torn and repair:
+            # Only a crash mid-append leaves a torn line; nobody is writing now
+            with open(self.journal_path, 'r+b') as f:
+                f.truncate(self._journal_offset)
+                os.fsync(f.fileno())
+        if touched is None or touched:
+            self._notify(touched)
+
+    def refresh(self):
+        """Pick up changes other processes made since this store last looked"""
+        with _file_lock(self.lock_path, exclusive=False):
+            self._catch_up(repair=False)
+
+    def _apply(self, data, record):
+        """Apply one journal record; returns the days whose spending changed"""
+        op = record['op']
+        if op == 'add_expense':
+            self._index_dates(data['expenses'], [record['expense']])
+            data['expenses'].append(record['expense'])
+            self.rollup.add_expense(record['expense'])
+            return {record['expense']['date']}
+        if op == 'add_expenses':
+            self._index_dates(data['expenses'], record['expenses'])
+            data['expenses'].extend(record['expenses'])
+            for expense in record['expenses']:
+                self.rollup.add_expense(expense)
+            return {expense['date'] for expense in record['expenses']}
+        if op == 'update_expense':
+            expense = data['expenses'][record['index']]
+            old_date = expense['date']
+            self.rollup.remove_expense(expense)
+            expense.update(record['changes'])
+            self.rollup.add_expense(expense)
+            if self._date_index is not None and expense['date'] != old_date:
+                self._date_index[old_date].remove(record['index'])
+                bisect.insort(self._date_index.setdefault(expense['date'], []), record['index'])
+            return {old_date, expense['date']}
+        if op == 'set':
+            data[record['key']] = record['value']
+            return set()
+        raise ValueError(f"Unknown journal operation: {op}")
+
+    def _index_dates(self, stored, expenses):
+        """Add expenses about to be appended to ``stored`` to the date index"""
+        if self._date_index is None:
+            return
+        for index, expense in enumerate(expenses, len(stored)):
+            self._date_index.setdefault(expense['date'], []).append(index)
+
+    # ========================
+    # CHANGES
+    # ========================
+
+    def _append(self, record):
+        with _file_lock(self.lock_path, exclusive=True):
+            self._catch_up()
+            record['seq'] = self.seq + 1
+            line = (json.dumps(record, ensure_ascii=False) + '\n').encode('utf-8')
+            with open(self.journal_path, 'ab') as f:
+                f.write(line)
+                f.flush()
+                os.fsync(f.fileno())
+            days = self._apply(self.data, record)
+            self.seq = record['seq']
+            self._journal_offset += len(line)
+            self.journal_records += len(record.get('expenses', ())) or 1
+            if self.journal_records >= self.compact_every:
+                self._write_snapshot()
+        if days:
+            self._notify(days)
+
+    def add_expense(self, expense):
+        """Append an expense; returns its index"""
+        self._append({'op': 'add_expense', 'expense': expense})
+        return len(self.data['expenses']) - 1
+
+    def add_expenses(self, expenses):
+        """Append many expenses as one journal record, so all or none survive a crash"""
+        if expenses:
+            self._append({'op': 'add_expenses', 'expenses': list(expenses)})
+
+    def update_expense(self, index, **changes):
+        """Change fields of a stored expense"""
+        if not -len(self.data['expenses']) <= index < len(self.data['expenses']):
+            raise IndexError(f"No expense at index {index}")
+        # Resolved now: other writers may append before the record is written
+        index %= len(self.data['expenses'])
+        self._append({'op': 'update_expense', 'index': index, 'changes': changes})
+        return self.data['expenses'][index]
+
+    def set(self, key, value):
+        """Replace a top-level field such as 'study_plan'"""
+        self._append({'op': 'set', 'key': key, 'value': value})
+
+    # ========================
+    # COMPACTION
+    # ========================
+
+    def compact(self):
+        """Fold the journal into a fresh snapshot and empty the journal"""
+        with _file_lock(self.lock_path, exclusive=True):
+            self._catch_up()
+            self._write_snapshot()
+
+    def _write_snapshot(self):
+        snapshot = dict(self.data)
+        snapshot[_SEQ_KEY] = self.seq
+        snapshot[_ROLLUP_KEY] = self.rollup.days
+        tmp_path = self.snapshot_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            # One dumps call without indent runs on the C encoder; json.dump
+            # and indented output fall back to the pure-Python one
+            f.write(json.dumps(snapshot, ensure_ascii=False))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.snapshot_path)
+        _fsync_dir(self.snapshot_path)
+
+        # Records up to self.seq are now in the snapshot, so a crash before
+        # this truncation only leaves records that load() will skip
+        with open(self.journal_path, 'w') as f:
+            os.fsync(f.fileno())
+        self.journal_records = 0
+        self._journal_offset = 0
+        self._snapshot_stamp = _file_stamp(self.snapshot_path)
+
+    # ========================
+    # QUERIES
+    # ========================
+
+    @property
+    def version(self):
+        """Counter that grows with every change, for detecting stale exports"""
+        return self.seq
+
+    def spending_by_category(self, since=None, until=None):
+        """{category: total} of expenses dated within [since, until] (ISO dates)"""
+        return self.rollup.totals(since, until)
+
+    def daily_totals(self, since=None, until=None):
+        """{day: {category: total}} for days within [since, until] with spending"""
+        return {day: dict(bucket) for day, bucket in self.rollup.days.items()
+                if (since is None or day >= since) and (until is None or day <= until)}
+
+    def verify_rollups(self):
+        """Mismatches between the rollup and one rebuilt from raw expenses"""
+        return self.rollup.diff(SpendingRollup.build(self.data['expenses']))
+
+    def rebuild_rollups(self):
+        self.rollup = SpendingRollup.build(self.data['expenses'])
+        self._notify(None)
+
+    def expense_stats(self):
+        """Count, total and mean amount of all expenses"""
+        count, total = len(self.data['expenses']), self.rollup.total
+        return {'count': count, 'total': total, 'mean': total / count if count else 0.0}
+
+    def recent_expenses(self, n=10):
+        """The last ``n`` expenses, oldest first"""
+        return self.data['expenses'][-n:] if n else []
+
+    def expenses_on(self, day):
+        """Expenses dated ``day`` (an ISO date), in the order they were added"""
+        if self._date_index is None:
+            self._date_index = {}
+            self._index_dates([], self.data['expenses'])
+        expenses = self.data['expenses']
+        return [expenses[index] for index in self._date_index.get(day, ())]
+
+# ========================
+# SQLITE BACKEND
+# ========================
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS expenses (
+    id INTEGER PRIMARY KEY,
+    date TEXT NOT NULL,
+    transaction_text TEXT NOT NULL,
+    amount NUMERIC NOT NULL,
+    category TEXT NOT NULL,
+    confidence REAL,
+    extra TEXT
+);
+-- Covers date-range summaries: they never touch the table itself
+CREATE INDEX IF NOT EXISTS idx_expenses_date ON expenses (date, category, amount);
+CREATE INDEX IF NOT EXISTS idx_expenses_category_date ON expenses (category, date);
+CREATE TABLE IF NOT EXISTS settings (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+-- Spending rollup, kept current by the triggers below in the same
+-- transaction as the expense change
+CREATE TABLE IF NOT EXISTS daily_totals (
+    date TEXT NOT NULL,
+    category TEXT NOT NULL,
+    total NUMERIC NOT NULL,
+    PRIMARY KEY (date, category)
+) WITHOUT ROWID;
+CREATE TRIGGER IF NOT EXISTS trg_expenses_insert AFTER INSERT ON expenses BEGIN
+    INSERT INTO daily_totals VALUES (NEW.date, NEW.category, NEW.amount)
+    ON CONFLICT (date, category) DO UPDATE SET total = total + excluded.total;
+END;
+CREATE TRIGGER IF NOT EXISTS trg_expenses_update AFTER UPDATE OF date, category, amount ON expenses BEGIN
+    UPDATE daily_totals SET total = total - OLD.amount
+    WHERE date = OLD.date AND category = OLD.category;
+    INSERT INTO daily_totals VALUES (NEW.date, NEW.category, NEW.amount)
+    ON CONFLICT (date, category) DO UPDATE SET total = total + excluded.total;
+END;
+-- Bumped by every expense change, so exports can tell they are stale
+CREATE TABLE IF NOT EXISTS store_version (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    version INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO store_version VALUES (1, 0);
+"""
+
+# Expense dict key -> column. Any other keys go to the JSON 'extra' column.
+_EXPENSE_COLUMNS = {
+    'date': 'date',
+    'transaction': 'transaction_text',
+    'amount': 'amount',
+    'category': 'category',
+    'confidence': 'confidence'
+}
+_BUMP_VERSION = "UPDATE store_version SET version = version + 1"
+_SELECT_EXPENSE = "SELECT date, transaction_text, amount, category, confidence, extra FROM expenses"
+_INSERT_EXPENSE = ("INSERT INTO expenses (date, transaction_text, amount, category, confidence, extra) "
+                   "VALUES (?, ?, ?, ?, ?, ?)")
+
+def _row_to_expense(row):
+    expense = dict(zip(_EXPENSE_COLUMNS, row[:5]))
+    if row[5]:
+        expense.update(json.loads(row[5]))
+    return expense
+
+def _expense_to_row(expense):
+    extra = {k: v for k, v in expense.items() if k not in _EXPENSE_COLUMNS}
+    return (expense['date'], expense['transaction'], expense['amount'], expense['category'],
+            expense.get('confidence'), json.dumps(extra, ensure_ascii=False) if extra else None)
+
+class ExpenseRows(Sequence):
+    """Read-only list view of the expenses table
+
+    Expense ``i`` is the row with id ``i + 1``; ids are assigned densely
+    and rows are never deleted, so indexing is a primary-key lookup and
+    nothing is loaded until it is read.
+    """
+
+    def __init__(self, conn):
+        self._conn = conn
+        self._len = conn.execute("SELECT COUNT(*) FROM expenses").fetchone()[0]
+
+    def __len__(self):
+        return self._len
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(self._len)
+            if step != 1:
+                return [self[i] for i in range(start, stop, step)]
+            rows = self._conn.execute(_SELECT_EXPENSE + " WHERE id > ? AND id <= ? ORDER BY id",
+                                      (start, stop)).fetchall()
+            return [_row_to_expense(row) for row in rows]
+        if index < 0:
+            index += self._len
+        if not 0 <= index < self._len:
+            raise IndexError("expense index out of range")
+        row = self._conn.execute(_SELECT_EXPENSE + " WHERE id = ?", (index + 1,)).fetchone()
+        return _row_to_expense(row)
+
+    def __iter__(self):
+        for row in self._conn.execute(_SELECT_EXPENSE + " ORDER BY id"):
+            yield _row_to_expense(row)
+
+class SQLiteStore(_ChangeNotifier):
+    """User data in an SQLite database, with the JournalStore interface
+
+    ``data['expenses']`` is an ``ExpenseRows`` view rather than a list;
+    the other top-level fields live in a key/value settings table.
+    Summaries are range queries over the ``daily_totals`` rollup table,
+    which triggers keep in step with the expenses table.
+
+    Writes run in ``BEGIN IMMEDIATE`` transactions and ids are assigned by
+    SQLite, so several processes can write the same database; readers are
+    never blocked under WAL.
+    """
+
+    def __init__(self, path='user_data.db', timeout=30.0):
+        self.path = path
+        self._listeners = []
+        # Autocommit mode: transactions are opened explicitly by _write.
+        # Web sessions keep one store across requests served by different
+        # threads; each session uses it from one thread at a time.
+        self.conn = sqlite3.connect(path, timeout=timeout, isolation_level=None,
+                                    check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(_SCHEMA)
+        # Databases created before the rollup table existed
+        has_expenses = self.conn.execute("SELECT EXISTS (SELECT 1 FROM expenses)").fetchone()[0]
+        has_totals = self.conn.execute("SELECT EXISTS (SELECT 1 FROM daily_totals)").fetchone()[0]
+        if has_expenses and not has_totals:
+            self.rebuild_rollups()
+        self.data = self.load()
+        # Changes when another connection commits
+        self._data_version = self._read_data_version()
+
+    def _read_data_version(self):
+        return self.conn.execute("PRAGMA data_version").fetchone()[0]
+
+    @contextmanager
+    def _write(self):
+        """Transaction holding the database write lock from its start"""
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield
+        except BaseException:
+            self.conn.execute("ROLLBACK")
+            raise
+        self.conn.execute("COMMIT")
+
+    def load(self):
+        data = {key: json.loads(json.dumps(value)) for key, value in DEFAULT_USER_DATA.items()}
+        for key, value in self.conn.execute("SELECT key, value FROM settings"):
+            data[key] = json.loads(value)
+        data['expenses'] = ExpenseRows(self.conn)
+        return data
+
+    def add_expense(self, expense):
+        """Append an expense; returns its index"""
+        with self._write():
+            row_id = self.conn.execute(_INSERT_EXPENSE, _expense_to_row(expense)).lastrowid
+            self.conn.execute(_BUMP_VERSION)
+        # Rows other processes added meanwhile are part of the view too
+        self.data['expenses']._len = row_id
+        self._notify({expense['date']})
+        return row_id - 1
+
+    def add_expenses(self, expenses):
+        """Append many expenses in one transaction"""
+        days = set()
+
+        def rows():
+            for expense in expenses:
+                days.add(expense['date'])
+                yield _expense_to_row(expense)
+
+        with self._write():
+            self.conn.executemany(_INSERT_EXPENSE, rows())
+            self.conn.execute(_BUMP_VERSION)
+            self.data['expenses']._len = self.conn.execute(
+                "SELECT COUNT(*) FROM expenses").fetchone()[0]
+        if days:
+            self._notify(days)
+
+    def update_expense(self, index, **changes):
+        """Change fields of a stored expense"""
+        expenses = self.data['expenses']
+        if not -len(expenses) <= index < len(expenses):
+            raise IndexError(f"No expense at index {index}")
+        index %= len(expenses)
+        with self._write():
+            # Read inside the transaction, so a concurrent update isn't lost
+            expense = expenses[index]
+            old_date = expense['date']
+            expense.update(changes)
+            self.conn.execute(
+                "UPDATE expenses SET date = ?, transaction_text = ?, amount = ?, category = ?, "
+                "confidence = ?, extra = ? WHERE id = ?",
+                _expense_to_row(expense) + (index + 1,))
+            self.conn.execute(_BUMP_VERSION)
+        self._notify({old_date, expense['date']})
+        return expense
+
+    def set(self, key, value):
+        """Replace a top-level field such as 'study_plan'"""
+        if key == 'expenses':
+            raise ValueError("Expenses are changed through add_expense/update_expense")
+        with self._write():
+            self.conn.execute("INSERT OR REPLACE INTO settings VALUES (?, ?)",
+                              (key, json.dumps(value, ensure_ascii=False)))
+        self.data[key] = value
+
+    def refresh(self):
+        """Pick up changes other processes made since this store last looked"""
+        version = self._read_data_version()
+        if version == self._data_version:
+            return
+        self._data_version = version
+        fresh = self.load()
+        self.data.clear()
+        self.data.update(fresh)
+        # Which days changed is not recorded, so views start over
+        self._notify(None)
+
+    def compact(self):
+        """Checkpoint the write-ahead log and refresh planner statistics"""
+        self.conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        self.conn.execute("PRAGMA optimize")
+
+    def close(self):
+        self.conn.close()
+
+    @property
+    def version(self):
+        """Counter bumped by every expense change, by any process"""
+        return self.conn.execute("SELECT version FROM store_version").fetchone()[0]
+
+    def spending_by_category(self, since=None, until=None):
+        """{category: total} of expenses dated within [since, until] (ISO dates)"""
+        conditions, params = [], []
+        if since is not None:
+            conditions.append("date >= ?")
+            params.append(since)
+        if until is not None:
+            conditions.append("date <= ?")
+            params.append(until)
+        where = f"WHERE {' AND '.join(conditions)} " if conditions else ""
+        rows = self.conn.execute(f"SELECT category, SUM(total) FROM daily_totals {where}"
+                                 "GROUP BY category HAVING SUM(total) != 0", params)
+        return dict(rows.fetchall())
+
+    def daily_totals(self, since=None, until=None):
+        """{day: {category: total}} for days within [since, until] with spending"""
+        conditions, params = ["total != 0"], []
+        if since is not None:
+            conditions.append("date >= ?")
+            params.append(since)
+        if until is not None:
+            conditions.append("date <= ?")
+            params.append(until)
+        days = {}
+        for day, category, total in self.conn.execute(
+                f"SELECT date, category, total FROM daily_totals WHERE {' AND '.join(conditions)}",
+                params):
+            days.setdefault(day, {})[category] = total
+        return days
+
+    def verify_rollups(self):
+        """Mismatches between daily_totals and a GROUP BY over the expenses"""
+        rows = self.conn.execute("""
+            SELECT e.date, e.category, COALESCE(d.total, 0), e.total FROM
+                (SELECT date, category, SUM(amount) AS total FROM expenses
+                 GROUP BY date, category) AS e
+            LEFT JOIN daily_totals AS d USING (date, category)
+            WHERE ABS(COALESCE(d.total, 0) - e.total) > 1e-6
+            UNION ALL
+            SELECT d.date, d.category, d.total, 0 FROM daily_totals AS d
+            WHERE ABS(d.total) > 1e-6 AND NOT EXISTS (
+                SELECT 1 FROM expenses WHERE date = d.date AND category = d.category)
+            ORDER BY 1, 2""")
+        return rows.fetchall()
+
+    def rebuild_rollups(self):
+        with self._write():
+            self.conn.execute("DELETE FROM daily_totals")
+            self.conn.execute("INSERT INTO daily_totals SELECT date, category, SUM(amount) "
+                              "FROM expenses GROUP BY date, category")
+        self._notify(None)
+
+    def expense_stats(self):
+        """Count, total and mean amount of all expenses"""
+        # Ids are never reused, so the largest is the count; the total comes
+        # from the rollup, which has a row per day rather than per expense
+        count = self.conn.execute("SELECT COALESCE(MAX(id), 0) FROM expenses").fetchone()[0]
+        total = self.conn.execute(
+            "SELECT COALESCE(SUM(total), 0) FROM daily_totals").fetchone()[0]
+        return {'count': count, 'total': total, 'mean': total / count if count else 0.0}
+
+    def recent_expenses(self, n=10):
+        """The last ``n`` expenses, oldest first"""
+        rows = self.conn.execute(_SELECT_EXPENSE + " ORDER BY id DESC LIMIT ?", (n,)).fetchall()
+        return [_row_to_expense(row) for row in reversed(rows)]
+
+    def expenses_on(self, day):
+        """Expenses dated ``day`` (an ISO date), in the order they were added"""
+        rows = self.conn.execute(_SELECT_EXPENSE + " WHERE date = ? ORDER BY id", (day,))
+        return [_row_to_expense(row) for row in rows]
+
+def open_store(path='user_data.json'):
+    """SQLiteStore for .db/.sqlite paths, JournalStore otherwise"""
+    if path.endswith(('.db', '.sqlite', '.sqlite3')):
+        return SQLiteStore(path)
+    return JournalStore(path)
+
+class ShardedStore:
+    """Separate stores per user, for multi-user deployments
+
+    A user's data lives in ``<root>/<xx>/<digest>.json`` (or ``.db``),
+    where ``digest`` is the SHA-1 of the user id and ``xx`` its first two
+    hex digits, so ids never reach the filesystem as-is and no directory
+    grows too large. Opening a user reads only that user's files, and
+    locks are per user, so sessions of different users never wait on
+    each other.
+    """
+
+    def __init__(self, root='user_data', backend='json'):
+        if backend not in ('json', 'sqlite'):
+            raise ValueError(f"Unknown storage backend: {backend}")
+        self.root = root
+        self.backend = backend
+
+    def path_for(self, user_id):
+        digest = hashlib.sha1(str(user_id).encode('utf-8')).hexdigest()
+        suffix = '.db' if self.backend == 'sqlite' else '.json'
+        return os.path.join(self.root, digest[:2], digest + suffix)
+
+    def for_user(self, user_id):
+        path = self.path_for(user_id)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        return open_store(path)
+
+def migrate_to_sqlite(json_path='user_data.json', db_path='user_data.db'):
+    """Import a JSON snapshot (and its journal) into a new SQLite database"""
+    source = JournalStore(json_path)
+    if os.path.exists(db_path):
+        raise FileExistsError(f"{db_path} already exists")
+    target = SQLiteStore(db_path)
+    target.add_expenses(source.data['expenses'])
+    for key, value in source.data.items():
+        if key != 'expenses':
+            target.set(key, value)
+    # Table statistics, so the planner picks the date index for range queries
+    target.conn.execute("ANALYZE")
+    target.close()
+    return len(source.data['expenses'])
+
+# ========================
+# MAIN EXECUTION
+# ========================
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Manage Smart Life Assistant user data")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    migrate = subparsers.add_parser('migrate', help="Import user_data.json into SQLite")
+    migrate.add_argument('source', nargs='?', default='user_data.json')
+    migrate.add_argument('target', nargs='?', default='user_data.db')
+    shard = subparsers.add_parser('shard', help="Import a single-user file as one user's shard")
+    shard.add_argument('source', nargs='?', default='user_data.json')
+    shard.add_argument('--user', default='default')
+    shard.add_argument('--root', default='user_data')
+    shard.add_argument('--backend', choices=['json', 'sqlite'], default='json')
+    compact = subparsers.add_parser('compact', help="Fold the journal into the snapshot")
+    compact.add_argument('path', nargs='?', default='user_data.json')
+    rollups = subparsers.add_parser('rollups', help="Check the spending rollup against raw expenses")
+    rollups.add_argument('path', nargs='?', default='user_data.json')
+    rollups.add_argument('--rebuild', action='store_true', help="Rebuild it from raw expenses")
+    args = parser.parse_args(argv)
+
+    if args.command == 'migrate':
+        count = migrate_to_sqlite(args.source, args.target)
+        print(f"✓ Migrated {count:,} expenses from {args.source} to {args.target}")
+    elif args.command == 'shard':
+        source = JournalStore(args.source)
+        target = ShardedStore(args.root, args.backend).for_user(args.user)
+        if len(target.data['expenses']):
+            raise SystemExit(f"✗ User {args.user!r} already has data in {args.root}")
+        for expense in source.data['expenses']:
+            target.add_expense(expense)
+        for key, value in source.data.items():
+            if key != 'expenses':
+                target.set(key, value)
+        target.compact()
+        print(f"✓ Imported {len(source.data['expenses']):,} expenses for user {args.user!r}")
+    elif args.command == 'compact':
+        open_store(args.path).compact()
+        print(f"✓ Compacted {args.path}")
+    else:
+        store = open_store(args.path)
+        if args.rebuild:
+            store.rebuild_rollups()
+            store.compact()
+            print(f"✓ Rebuilt rollups of {args.path}")
+        mismatches = store.verify_rollups()
+        for day, category, stored, actual in mismatches[:20]:
+            print(f"  {day} {category}: rollup {stored} != expenses {actual}")
+        print(f"{'✗' if mismatches else '✓'} {len(mismatches)} mismatched day/category buckets")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+"""
+STREAMING TRAINER
+Out-of-core training of the expense categorizer on large labeled
+CSV/JSONL transaction files, one chunk at a time
+"""
+
+import argparse
+import resource
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+from sklearn.metrics import accuracy_score
+
+from train_model import CATEGORIES, OnlineExpenseCategorizer, preprocess_series
+
+# Its own artifact: train_model seeds and corrections update the online
+# checkpoint, which a streamed model must not replace or be replaced by
+STREAM_MODEL_PATH = 'expense_categorizer_stream.pkl'
+
+# ========================
+# 1. CHUNKED READING
+# ========================
+
+def iter_labeled_chunks(path, chunksize=50000, text_column='transaction',
+                        label_column='category'):
+    """Yield (texts, labels) Series chunks from a CSV or JSONL file"""
+    if path.endswith(('.jsonl', '.json')):
+        reader = pd.read_json(path, lines=True, chunksize=chunksize)
+    else:
+        reader = pd.read_csv(path, chunksize=chunksize,
+                             usecols=[text_column, label_column])
+
+    with reader:
+        for chunk in reader:
+            chunk = chunk.dropna(subset=[text_column, label_column])
+            yield chunk[text_column], chunk[label_column].astype(str)
+
+# ========================
+# 2. ON-THE-FLY STRATIFIED HOLDOUT
+# ========================
+
+class StratifiedHoldout:
+    """Systematic per-category holdout sampling over a stream
+
+    Every category's rows are counted as they arrive and every
+    1/fraction-th row of each category is held out, so the holdout keeps
+    the class balance of the stream without knowing it in advance.
+    At most ``max_per_class`` rows per category are held out; the choice
+    only depends on stream position, so later epochs skip the same rows.
+    """
+
+    def __init__(self, fraction=0.1, max_per_class=10000):
+        self.fraction = fraction
+        self.max_per_class = max_per_class
+        self.texts = {}
+        self.collect = True
+        self.seen = {}
+        self.held = {}
+
+    def start_epoch(self, collect):
+        """Rewind the stream position, optionally keeping the held rows"""
+        self.collect = collect
+        self.seen = {}
+        self.held = {}
+
+    def split(self, texts, labels):
+        """Remove the held-out rows of a chunk and return the training rows"""
+        labels = labels.reset_index(drop=True)
+        texts = texts.reset_index(drop=True)
+
+        position = labels.map(self.seen).fillna(0).astype(np.int64)
+        position += labels.groupby(labels).cumcount()
+        held = (np.floor((position + 1) * self.fraction)
+                > np.floor(position * self.fraction))
+
+        held_labels = labels[held]
+        held_position = held_labels.map(self.held).fillna(0).astype(np.int64)
+        held_position += held_labels.groupby(held_labels).cumcount()
+        held[held_position.index[held_position >= self.max_per_class]] = False
+
+        for category, count in labels.value_counts().items():
+            self.seen[category] = self.seen.get(category, 0) + int(count)
+        for category, count in labels[held].value_counts().items():
+            self.held[category] = self.held.get(category, 0) + int(count)
+
+        if self.collect:
+            for category, group in texts[held].groupby(labels[held]):
+                self.texts.setdefault(category, []).extend(group)
+
+        return texts[~held], labels[~held]
+
+    def as_lists(self):
+        """The held-out rows as parallel text and label lists"""
+        texts, labels = [], []
+        for category, rows in self.texts.items():
+            texts.extend(rows)
+            labels.extend([category] * len(rows))
+        return texts, labels
+
+# ========================
+# 3. TRAINING LOOP
+# ========================
+
+def peak_memory_mb():
+    """Peak resident set size of this process in MB"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KB, macOS reports bytes
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+def stream_train(paths, output=STREAM_MODEL_PATH, chunksize=50000,
+                 holdout_fraction=0.1, epochs=1, text_column='transaction',
+                 label_column='category'):
+    """Fit the online categorizer on labeled files without loading them whole"""
+    categorizer = OnlineExpenseCategorizer(output, checkpoint_every=0)
+    holdout = StratifiedHoldout(holdout_fraction)
+    known = set(CATEGORIES)
+
+    rows = skipped = 0
+    start = time.perf_counter()
+    for epoch in range(epochs):
+        # The holdout rows are only collected on the first pass
+        holdout.start_epoch(collect=epoch == 0)
+        for path in paths:
+            for texts, labels in iter_labeled_chunks(path, chunksize, text_column, label_column):
+                valid = labels.isin(known)
+                if epoch == 0:
+                    skipped += int((~valid).sum())
+                texts, labels = holdout.split(preprocess_series(texts[valid]), labels[valid])
+
+                if len(labels):
+                    categorizer.partial_fit(texts, labels)
+                rows += len(labels)
+
+            print(f"  epoch {epoch + 1}: {path} done, {rows:,} rows trained "
+                  f"({rows / (time.perf_counter() - start):,.0f} rows/s)")
+
+    elapsed = time.perf_counter() - start
+    categorizer.checkpoint()
+
+    X_holdout, y_holdout = holdout.as_lists()
+    accuracy = accuracy_score(y_holdout, categorizer.predict(X_holdout)) if y_holdout else None
+
+    return {
+        'rows_trained': rows,
+        'rows_skipped': skipped,
+        'holdout_rows': len(y_holdout),
+        'holdout_accuracy': accuracy,
+        'seconds': elapsed,
+        'rows_per_second': rows / elapsed if elapsed else 0.0,
+        'peak_memory_mb': peak_memory_mb(),
+        'model_path': output
+    }
+
+# ========================
+# MAIN EXECUTION
+# ========================
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Stream-train the expense categorizer")
+    parser.add_argument('paths', nargs='+', help="Labeled CSV or JSONL files")
+    parser.add_argument('--output', default=STREAM_MODEL_PATH)
+    parser.add_argument('--chunksize', type=int, default=50000)
+    parser.add_argument('--holdout', type=float, default=0.1)
+    parser.add_argument('--epochs', type=int, default=1)
+    parser.add_argument('--text-column', default='transaction')
+    parser.add_argument('--label-column', default='category')
+    args = parser.parse_args(argv)
+
+    print("=" * 60)
+    print("STREAMING TRAINING")
+    print("=" * 60)
+    report = stream_train(args.paths, args.output, args.chunksize, args.holdout,
+                          args.epochs, args.text_column, args.label_column)
+
+    print(f"\nRows trained:     {report['rows_trained']:,}")
+    print(f"Rows skipped:     {report['rows_skipped']:,} (unknown category)")
+    print(f"Throughput:       {report['rows_per_second']:,.0f} rows/s")
+    print(f"Peak memory:      {report['peak_memory_mb']:.1f} MB")
+    if report['holdout_accuracy'] is not None:
+        print(f"Holdout accuracy: {report['holdout_accuracy'] * 100:.2f}% "
+              f"on {report['holdout_rows']:,} rows")
+    print(f"Model saved as {report['model_path']} "
+          f"(serve it with load_predictor(model_path='{report['model_path']}', compact_path=None))")
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,17 @@
 import streamlit as st
 import pandas as pd
 from datetime import datetime
-import json
 import os
+import tempfile
 
 # Import our modules
-from predict import ExpensePredictor
+from analytics import SpendingAnalytics
+from dedup import DuplicateDetector
+from predict import HotReloadingPredictor
+from statement_import import import_statement
+from storage import ShardedStore
 from study_plan_agent import AIStudyPlanAgent
+from transaction_parser import parse_transaction
 
 # Page config
 st.set_page_config(
@@ -19,23 +24,51 @@ st.set_page_config(
 @st.cache_resource
 def load_models():
     try:
-        expense_predictor = ExpensePredictor()
+        expense_predictor = HotReloadingPredictor()
         study_agent = AIStudyPlanAgent()
         return expense_predictor, study_agent
     except Exception as e:
         st.error(f"Error loading models: {e}")
         return None, None
 
-# Load user data
-def load_user_data():
-    if os.path.exists('user_data.json'):
-        with open('user_data.json', 'r') as f:
-            return json.load(f)
-    return {'expenses': [], 'study_plan': None}
+# User data is sharded per user under SMART_LIFE_DATA_DIR, in JSON journal
+# or SQLite files (SMART_LIFE_BACKEND)
+USER_STORES = ShardedStore(os.environ.get('SMART_LIFE_DATA_DIR', 'user_data'),
+                           os.environ.get('SMART_LIFE_BACKEND', 'json'))
 
-def save_user_data(data):
-    with open('user_data.json', 'w') as f:
-        json.dump(data, f, indent=2)
+# Deployments behind an authenticating proxy name the request header that
+# carries the signed-in user; otherwise Streamlit's own login (st.login,
+# configured under [auth] in .streamlit/secrets.toml) identifies users.
+# SMART_LIFE_LOCAL_USER lets a single-user local run skip signing in.
+USER_HEADER = os.environ.get('SMART_LIFE_USER_HEADER')
+LOCAL_USER = os.environ.get('SMART_LIFE_LOCAL_USER')
+
+def current_user_id():
+    """Shard key of the authenticated user, or None if nobody is signed in"""
+    if USER_HEADER:
+        return st.context.headers.get(USER_HEADER) or None
+    if st.user.get('is_logged_in'):
+        return st.user.get('email') or st.user.get('sub')
+    return LOCAL_USER
+
+def load_user_store(user_id):
+    """Session-cached store and analytics views, caught up with other sessions' changes"""
+    key = f'user_store:{user_id}'
+    if key not in st.session_state:
+        store = USER_STORES.for_user(user_id)
+        st.session_state[key] = (store, SpendingAnalytics(store))
+    store, analytics = st.session_state[key]
+    store.refresh()
+    return store, analytics
+
+def get_duplicate_detector(user_id, data):
+    """Session-cached duplicate detector, caught up with the user's history"""
+    key = f'duplicate_detector:{user_id}'
+    detector = st.session_state.get(key)
+    if detector is None:
+        detector = st.session_state[key] = DuplicateDetector()
+    detector.sync(data['expenses'])
+    return detector
 
 # Main app
 def main():
@@ -44,10 +77,22 @@ def main():
     
     # Load models
     expense_predictor, study_agent = load_models()
-    user_data = load_user_data()
     
     # Sidebar
     st.sidebar.title("📱 Navigation")
+    user_id = current_user_id()
+    if user_id is None:
+        # Data is sharded by identity, so nothing is shown until it is known
+        st.info("Please sign in to see your expenses and study plans.")
+        if not USER_HEADER:
+            st.button("🔑 Sign in", on_click=st.login)
+        st.stop()
+    st.sidebar.caption(f"👤 {user_id}")
+    if st.user.get('is_logged_in'):
+        st.sidebar.button("Sign out", on_click=st.logout)
+    store, analytics = load_user_store(user_id)
+    user_data = store.data
+    
     page = st.sidebar.radio(
         "Choose a feature:",
         ["🏠 Dashboard", "💰 Add Expense", "📊 Expense Analysis", "🎓 Study Plan", "📅 Today's Tasks"]
@@ -62,19 +107,27 @@ def main():
         with col1:
             st.subheader("💰 Financial Overview")
             if user_data['expenses']:
-                total = sum(e['amount'] for e in user_data['expenses'])
-                st.metric("Total Expenses", f"₹{total:,}")
+                total = store.expense_stats()['total']
+                mom = analytics.month_over_month(6)
+                this_month = mom.iloc[-1]
+                delta = None if pd.isna(this_month['pct_change']) else f"{this_month['pct_change']:+.1f}% vs last month"
+                
+                metric1, metric2 = st.columns(2)
+                metric1.metric("Total Expenses", f"₹{total:,}")
+                metric2.metric("This Month", f"₹{this_month['total']:,.0f}", delta, delta_color="inverse")
                 
-                # Category breakdown
-                category_totals = {}
-                for e in user_data['expenses']:
-                    cat = e['category']
-                    category_totals[cat] = category_totals.get(cat, 0) + e['amount']
+                # Category breakdown, from the store's rollup
+                category_totals = store.spending_by_category()
                 
                 df = pd.DataFrame(list(category_totals.items()), columns=['Category', 'Amount'])
                 df = df.sort_values('Amount', ascending=False)
                 
                 st.bar_chart(df.set_index('Category'))
+                
+                # Monthly trend, from the cached monthly view
+                st.write("**Last 6 months**")
+                monthly = analytics.monthly(6)
+                st.bar_chart(monthly.set_axis(monthly.index.astype(str)))
             else:
                 st.info("No expenses tracked yet. Add your first expense!")
         
@@ -100,33 +153,69 @@ def main():
         
         with st.form("expense_form"):
             transaction = st.text_input("Enter transaction (e.g., 'Swiggy order 450')")
+            allow_duplicate = st.checkbox("Add even if it looks like a duplicate")
             submitted = st.form_submit_button("Categorize & Add")
             
-            if submitted and transaction:
-                if expense_predictor:
-                    result = expense_predictor.predict_category(transaction)
-                    
-                    # Extract amount
-                    import re
-                    numbers = re.findall(r'\d+', transaction)
-                    amount = int(numbers[0]) if numbers else 0
+            if submitted and transaction and expense_predictor:
+                parsed = parse_transaction(transaction)
+                amount = parsed.amount
+                today = datetime.now().strftime('%Y-%m-%d')
+                detector = get_duplicate_detector(user_id, user_data)
+                duplicate = None if allow_duplicate else detector.check(today, transaction, amount)
+                
+                if duplicate:
+                    kind, index = duplicate
+                    earlier = user_data['expenses'][index]
+                    st.warning(f"⚠️ Not added: looks like a {kind} duplicate of "
+                               f"'{earlier['transaction']}' (₹{earlier['amount']}) from {earlier['date']}")
+                else:
+                    result = expense_predictor.predict_parsed(parsed)
                     
                     # Add to data
                     expense = {
-                        'date': datetime.now().strftime('%Y-%m-%d'),
+                        'date': today,
                         'transaction': transaction,
                         'amount': amount,
                         'category': result['category'],
                         'confidence': result['confidence']
                     }
-                    user_data['expenses'].append(expense)
-                    save_user_data(user_data)
+                    store.add_expense(expense)
+                    detector.sync(user_data['expenses'])
                     
                     st.success("✅ Expense added!")
                     col1, col2, col3 = st.columns(3)
                     col1.metric("Category", result['category'])
                     col2.metric("Amount", f"₹{amount}")
                     col3.metric("Confidence", f"{result['confidence']:.1f}%")
+        
+        st.subheader("📥 Import Bank Statement")
+        statement = st.file_uploader("CSV or OFX statement", type=['csv', 'ofx', 'qfx'])
+        signed = st.checkbox("Negative amounts are spending, positive ones are income")
+        if statement is not None and expense_predictor and st.button("Import"):
+            suffix = os.path.splitext(statement.name)[1]
+            with tempfile.TemporaryDirectory() as tmp:
+                path = os.path.join(tmp, 'statement' + suffix)
+                with open(path, 'wb') as f:
+                    f.write(statement.getbuffer())
+                with st.spinner("Categorizing statement..."):
+                    try:
+                        report = import_statement(path, store, expense_predictor,
+                                                  signed_amounts=signed, progress=False)
+                    except (OSError, ValueError) as e:
+                        report = None
+                        st.error(f"Could not import {statement.name}: {e}")
+                if report:
+                    st.success(f"✅ Imported {report['imported']:,} of {report['rows']:,} rows "
+                               f"in {report['seconds']:.1f}s")
+                    skipped = report['credits_skipped'] + report['duplicates_skipped']
+                    if skipped:
+                        st.info(f"Skipped {report['credits_skipped']:,} credits and "
+                                f"{report['duplicates_skipped']:,} already imported rows")
+                    if report['rejected']:
+                        st.warning(f"{report['rejected']:,} rows could not be read")
+                        with open(report['reject_path'], 'rb') as f:
+                            st.download_button("Download rejected rows", f.read(),
+                                               file_name=f"{statement.name}.rejects.csv")
     
     # Expense Analysis
     elif page == "📊 Expense Analysis":
@@ -135,24 +224,42 @@ def main():
         if not user_data['expenses']:
             st.warning("No expenses to analyze. Add some expenses first!")
         else:
-            # Create DataFrame
-            df = pd.DataFrame(user_data['expenses'])
-            df['date'] = pd.to_datetime(df['date'])
-            
-            # Stats
+            # Stats, aggregated by the store rather than from a full DataFrame
+            stats = store.expense_stats()
             col1, col2, col3 = st.columns(3)
-            col1.metric("Total Expenses", f"₹{df['amount'].sum():,}")
-            col2.metric("Transactions", len(df))
-            col3.metric("Avg Transaction", f"₹{df['amount'].mean():.0f}")
+            col1.metric("Total Expenses", f"₹{stats['total']:,}")
+            col2.metric("Transactions", stats['count'])
+            col3.metric("Avg Transaction", f"₹{stats['mean']:.0f}")
             
             # Category breakdown
             st.subheader("By Category")
-            category_df = df.groupby('category')['amount'].sum().sort_values(ascending=False)
+            category_df = pd.Series(store.spending_by_category()).sort_values(ascending=False)
             st.bar_chart(category_df)
             
+            # Weekly spending with its 4-week moving average
+            st.subheader("Weekly Spending")
+            weekly = analytics.moving_average('W', window=4, periods=26)
+            weekly = weekly.set_axis(weekly.index.start_time)
+            st.line_chart(weekly.rename(columns={'total': 'Spent', 'moving_average': '4-week average'}))
+            
+            # Month-over-month changes and per-category trends
+            col1, col2 = st.columns(2)
+            with col1:
+                st.subheader("Month over Month")
+                mom = analytics.month_over_month(6)
+                mom = mom.set_axis(mom.index.astype(str))
+                st.dataframe(mom.rename(columns={'total': 'Total', 'change': 'Change',
+                                                 'pct_change': 'Change %'}).round(1))
+            with col2:
+                st.subheader("Category Trends (6 months)")
+                trends = analytics.category_trends(6)
+                st.dataframe(trends[['mean', 'pct_per_month', 'trend']].rename(
+                    columns={'mean': 'Monthly avg', 'pct_per_month': '%/month', 'trend': 'Trend'}).round(1))
+            
             # Recent transactions
             st.subheader("Recent Transactions")
-            st.dataframe(df[['date', 'transaction', 'category', 'amount']].tail(10))
+            df = pd.DataFrame(store.recent_expenses(10))
+            st.dataframe(df[['date', 'transaction', 'category', 'amount']])
     
     # Study Plan
     elif page == "🎓 Study Plan":
@@ -166,8 +273,7 @@ def main():
             st.write(f"**Started:** {plan['start_date']}")
             
             if st.button("Create New Plan"):
-                user_data['study_plan'] = None
-                save_user_data(user_data)
+                store.set('study_plan', None)
                 st.rerun()
         else:
             st.write("### Choose Your Learning Path")
@@ -185,8 +291,7 @@ def main():
             if st.button("Create Study Plan"):
                 goal_key = goal_options[selected_goal]
                 plan = study_agent.create_study_plan(goal_key, hours_per_day)
-                user_data['study_plan'] = plan
-                save_user_data(user_data)
+                store.set('study_plan', plan)
                 st.success("✅ Study plan created!")
                 st.rerun()
     
@@ -6,7 +6,18 @@ class AIStudyPlanAgent:
     """AI Agent that creates personalized daily study plans"""
     
     def __init__(self):
-        self.learning_paths = {
+        self._learning_paths = None
+    
+    @property
+    def learning_paths(self):
+        """Catalog of learning paths, built on first use"""
+        if self._learning_paths is None:
+            self._learning_paths = self._build_learning_paths()
+        return self._learning_paths
+    
+    def _build_learning_paths(self):
+        """Build the full learning path catalog"""
+        return {
             'machine_learning': {
                 'name': 'Machine Learning Engineer',
                 'duration_weeks': 12,
@@ -1,13 +1,21 @@
 import pandas as pd
 import numpy as np
 from sklearn.model_selection import train_test_split
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.linear_model import LogisticRegression
+from sklearn.feature_extraction.text import TfidfVectorizer, HashingVectorizer
+from sklearn.linear_model import LogisticRegression, SGDClassifier
 from sklearn.metrics import classification_report, accuracy_score, confusion_matrix
+import os
 import pickle
-import re
 from datetime import datetime
 
+from merchant_index import MerchantIndex
+from transaction_parser import normalize_series, parse_transaction
+
+CATEGORIES = [
+    "Food", "Travel", "Shopping", "Entertainment", "Utilities",
+    "Healthcare", "Education", "Personal Care", "Investment", "Miscellaneous"
+]
+
 # ========================
 # 1. CREATE LABELED DATASET
 # ========================
@@ -154,31 +162,31 @@ def create_sample_dataset():
 # ========================
 
 def preprocess_text(text):
-    """Clean and preprocess transaction text"""
-    # Convert to lowercase
-    text = text.lower()
-    
-    # Remove special characters and numbers (keep the text)
-    text = re.sub(r'[^a-zA-Z\s]', ' ', text)
-    
-    # Remove extra whitespace
-    text = ' '.join(text.split())
+    """Clean and preprocess transaction text
     
-    return text
+    Lowercases, drops numbers and special characters and collapses
+    whitespace, via the shared single-pass transaction parser.
+    """
+    return parse_transaction(text).text
+
+def preprocess_series(texts):
+    """Vectorized preprocess_text over a pandas Series of transactions"""
+    return normalize_series(texts)
 
 # ========================
 # 3. BUILD AND TRAIN MODEL
 # ========================
 
 class ExpenseCategorizer:
-    def __init__(self):
+    def __init__(self, max_features=100, ngram_range=(1, 2), min_df=1, C=1.0, max_iter=1000):
         self.vectorizer = TfidfVectorizer(
-            max_features=100,
-            ngram_range=(1, 2),  # Use unigrams and bigrams
-            min_df=1
+            max_features=max_features,
+            ngram_range=ngram_range,  # Unigrams and bigrams by default
+            min_df=min_df
         )
         self.model = LogisticRegression(
-            max_iter=1000,
+            C=C,
+            max_iter=max_iter,
             random_state=42,
             multi_class='multinomial'
         )
@@ -203,10 +211,17 @@ class ExpenseCategorizer:
     
     def save_model(self, filename='expense_categorizer.pkl'):
         """Save the trained model"""
-        with open(filename, 'wb') as f:
+        # Write then rename, so running predictors never read a partial file
+        with open(filename + '.tmp', 'wb') as f:
             pickle.dump({'vectorizer': self.vectorizer, 'model': self.model}, f)
+        os.replace(filename + '.tmp', filename)
         print(f"Model saved as {filename}")
     
+    def export_compact(self, filename='expense_categorizer.bin'):
+        """Export a memory-mappable, sklearn-free copy for inference"""
+        from compact_model import export_compact_model
+        export_compact_model(self.vectorizer, self.model, filename)
+    
     def load_model(self, filename='expense_categorizer.pkl'):
         """Load a trained model"""
         with open(filename, 'rb') as f:
@@ -215,6 +230,75 @@ class ExpenseCategorizer:
             self.model = data['model']
         print(f"Model loaded from {filename}")
 
+class OnlineExpenseCategorizer:
+    """Incrementally trained categorizer for folding in user corrections
+    
+    Features are hashed, so there is no vocabulary to refit, and the
+    classifier is updated with partial_fit one batch at a time. Checkpoints
+    use the same pickle layout as ExpenseCategorizer, so ExpensePredictor
+    can serve them directly.
+    """
+    
+    def __init__(self, checkpoint_path='expense_categorizer_online.pkl',
+                 checkpoint_every=20, n_features=2 ** 18):
+        self.vectorizer = HashingVectorizer(
+            n_features=n_features,
+            ngram_range=(1, 2),
+            alternate_sign=False
+        )
+        self.model = SGDClassifier(
+            loss='log_loss',
+            alpha=1e-4,
+            random_state=42
+        )
+        self.checkpoint_path = checkpoint_path
+        self.checkpoint_every = checkpoint_every
+        self.pending_updates = 0
+    
+    @property
+    def is_fitted(self):
+        return hasattr(self.model, 'classes_')
+    
+    def partial_fit(self, X_texts, y):
+        """Fold a batch of preprocessed, labeled texts into the model"""
+        X = self.vectorizer.transform(X_texts)
+        self.model.partial_fit(X, y, classes=CATEGORIES)
+        
+        self.pending_updates += len(y)
+        if self.checkpoint_every and self.pending_updates >= self.checkpoint_every:
+            self.checkpoint()
+    
+    def learn_one(self, transaction_text, category):
+        """Learn from a single corrected transaction"""
+        self.partial_fit([preprocess_text(transaction_text)], [category])
+    
+    def predict(self, X_test):
+        """Make predictions"""
+        return self.model.predict(self.vectorizer.transform(X_test))
+    
+    def predict_proba(self, X_test):
+        """Get prediction probabilities"""
+        return self.model.predict_proba(self.vectorizer.transform(X_test))
+    
+    def checkpoint(self):
+        """Atomically write the current model to the checkpoint path"""
+        tmp_path = self.checkpoint_path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            pickle.dump({'vectorizer': self.vectorizer, 'model': self.model}, f)
+        os.replace(tmp_path, self.checkpoint_path)
+        self.pending_updates = 0
+    
+    @classmethod
+    def load_or_create(cls, checkpoint_path='expense_categorizer_online.pkl', **kwargs):
+        """Resume from the last checkpoint, or start an unfitted model"""
+        categorizer = cls(checkpoint_path, **kwargs)
+        if os.path.exists(checkpoint_path):
+            with open(checkpoint_path, 'rb') as f:
+                data = pickle.load(f)
+            categorizer.vectorizer = data['vectorizer']
+            categorizer.model = data['model']
+        return categorizer
+
 # ========================
 # 4. MAIN EXECUTION
 # ========================
@@ -265,6 +349,31 @@ def main():
     
     # Save model
     categorizer.save_model()
+    categorizer.export_compact()
+    
+    # Merchant fast path, mined from the training split and measured on the
+    # held-out one; it is only used ahead of the model if precise enough
+    merchant_index = MerchantIndex.from_training_data(X_train, y_train)
+    report = merchant_index.evaluate(X_test, y_test)
+    precision = "n/a" if report['precision'] is None else f"{report['precision'] * 100:.2f}%"
+    print(f"\nMerchant index: {merchant_index.size} phrases; on {len(X_test)} held-out "
+          f"transactions hit rate {report['hits'] / len(X_test) * 100:.1f}%, "
+          f"precision {precision} "
+          f"({'used' if merchant_index.trusted else 'NOT used'} ahead of the model)")
+    merchant_index.save()
+    
+    # Seed the incremental model that user corrections are folded into. An
+    # existing checkpoint already holds corrections and is kept as it is.
+    online = OnlineExpenseCategorizer.load_or_create(checkpoint_every=0)
+    if online.is_fitted:
+        print(f"Online model: keeping the existing checkpoint {online.checkpoint_path}")
+    else:
+        for _ in range(5):
+            online.partial_fit(X_train, y_train)
+        online.checkpoint()
+        print(f"Online model seeded as {online.checkpoint_path}")
+    online_accuracy = accuracy_score(y_test, online.predict(X_test))
+    print(f"Online model accuracy: {online_accuracy * 100:.2f}%")
     
     # Demo predictions
     print("\n" + "=" * 60)
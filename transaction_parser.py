@@ -0,0 +1,52 @@
+"""
+TRANSACTION PARSER
+One precompiled, single-pass scanner shared by every entry point that
+needs the amount, the normalized text or the tokens of a transaction
+"""
+
+import re
+from typing import List, NamedTuple, Union
+
+# Matched against lowercased text. Amounts may use western (12,345) or
+# Indian (1,23,456) thousands grouping and a decimal part; every other run
+# of letters is a word token, and everything else separates tokens.
+AMOUNT_PATTERN = r'\d{1,3}(?:,\d{2,3})+(?:\.\d+)?|\d+(?:\.\d+)?'
+_TOKEN_RE = re.compile(rf'(?P<amount>{AMOUNT_PATTERN})|(?P<word>[a-z]+)')
+
+class ParsedTransaction(NamedTuple):
+    amount: Union[int, float]
+    text: str
+    tokens: List[str]
+
+def parse_amount(value):
+    """Turn a matched amount string into an int, or a float if fractional"""
+    amount = float(value.replace(',', ''))
+    return int(amount) if amount.is_integer() else amount
+
+def parse_transaction(transaction_text):
+    """Extract the amount, normalized text and tokens in one scan
+
+    ``text`` is identical to what the model was trained on
+    (``train_model.preprocess_text``). ``amount`` is the first number in
+    the text, or 0 if there is none.
+    """
+    amount = None
+    tokens = []
+    for match in _TOKEN_RE.finditer(transaction_text.lower()):
+        word = match.group('word')
+        if word is not None:
+            tokens.append(word)
+        elif amount is None:
+            amount = parse_amount(match.group('amount'))
+    return ParsedTransaction(amount if amount is not None else 0, ' '.join(tokens), tokens)
+
+# ========================
+# VECTORIZED VARIANTS
+# ========================
+
+def normalize_series(texts):
+    """Vectorized ParsedTransaction.text over a pandas Series"""
+    return (texts.astype(str)
+            .str.lower()
+            .str.replace(r'[^a-z]+', ' ', regex=True)
+            .str.strip())
@@ -0,0 +1,200 @@
+"""
+HYPERPARAMETER TUNING
+Parallel k-fold search over vectorizer and classifier settings with
+on-disk caching of the vectorized fold matrices
+"""
+
+import argparse
+import hashlib
+import itertools
+import json
+import os
+import pickle
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.metrics import accuracy_score
+from sklearn.model_selection import StratifiedKFold
+
+from train_model import ExpenseCategorizer, create_sample_dataset, preprocess_series
+
+VECTORIZER_GRID = {
+    'max_features': [100, 500, 2000],
+    'ngram_range': [(1, 1), (1, 2)],
+    'min_df': [1]
+}
+
+CLASSIFIER_GRID = {
+    'C': [0.1, 1.0, 10.0],
+    'max_iter': [1000]
+}
+
+def expand_grid(grid):
+    """All combinations of a {param: [values]} grid as dicts"""
+    keys = sorted(grid)
+    return [dict(zip(keys, values)) for values in itertools.product(*(grid[k] for k in keys))]
+
+# ========================
+# 1. WORKER STATE
+# ========================
+
+# Set once per worker process by _init_worker, so the corpus is not
+# pickled into every task
+_texts = None
+_labels = None
+_folds = None
+_cache_dir = None
+_data_hash = None
+
+def _init_worker(texts, labels, folds, cache_dir, data_hash):
+    global _texts, _labels, _folds, _cache_dir, _data_hash
+    _texts, _labels, _folds = texts, labels, folds
+    _cache_dir, _data_hash = cache_dir, data_hash
+
+def _cache_path(vec_params, fold):
+    """Cache file prefix for one vectorizer config on one fold"""
+    key = json.dumps({'data': _data_hash, 'folds': len(_folds), 'fold': fold,
+                      'vectorizer': vec_params}, sort_keys=True)
+    return os.path.join(_cache_dir, hashlib.sha1(key.encode('utf-8')).hexdigest())
+
+def _build_features(vec_params, fold):
+    """Fit the vectorizer on a training fold and cache both fold matrices"""
+    prefix = _cache_path(vec_params, fold)
+    if os.path.exists(prefix + '.vectorizer.pkl'):
+        return True
+
+    train_idx, test_idx = _folds[fold]
+    vectorizer = TfidfVectorizer(**vec_params)
+    X_train = vectorizer.fit_transform(_texts[train_idx])
+    X_test = vectorizer.transform(_texts[test_idx])
+
+    # Write to temp names first; the vectorizer lands last and marks the
+    # entry complete, so a crashed build is never picked up as cached
+    for name, matrix in (('train', X_train), ('test', X_test)):
+        sparse.save_npz(f"{prefix}.{name}.tmp.npz", matrix)
+        os.replace(f"{prefix}.{name}.tmp.npz", f"{prefix}.{name}.npz")
+    with open(prefix + '.vectorizer.tmp', 'wb') as f:
+        pickle.dump(vectorizer, f)
+    os.replace(prefix + '.vectorizer.tmp', prefix + '.vectorizer.pkl')
+    return False
+
+def _evaluate(vec_params, clf_params, fold):
+    """Train one classifier config on a cached fold and measure it"""
+    prefix = _cache_path(vec_params, fold)
+    X_train = sparse.load_npz(prefix + '.train.npz')
+    X_test = sparse.load_npz(prefix + '.test.npz')
+    with open(prefix + '.vectorizer.pkl', 'rb') as f:
+        vectorizer = pickle.load(f)
+
+    train_idx, test_idx = _folds[fold]
+    categorizer = ExpenseCategorizer(**vec_params, **clf_params)
+    categorizer.vectorizer = vectorizer
+    categorizer.model.fit(X_train, _labels[train_idx])
+    accuracy = accuracy_score(_labels[test_idx], categorizer.model.predict(X_test))
+
+    # End-to-end inference latency on raw fold text, best of a few runs
+    test_texts = _texts[test_idx]
+    latency = float('inf')
+    for _ in range(5):
+        start = time.perf_counter()
+        categorizer.predict_proba(test_texts)
+        latency = min(latency, (time.perf_counter() - start) / len(test_texts))
+
+    size = len(pickle.dumps({'vectorizer': categorizer.vectorizer, 'model': categorizer.model}))
+    return accuracy, latency, size
+
+# ========================
+# 2. SEARCH
+# ========================
+
+def tune(texts, labels, folds=5, workers=None, cache_dir='.tuning_cache',
+         vectorizer_grid=VECTORIZER_GRID, classifier_grid=CLASSIFIER_GRID):
+    """Cross-validate every grid combination and return the leaderboard"""
+    texts = np.asarray(preprocess_series(pd.Series(texts)), dtype=object)
+    labels = np.asarray(labels, dtype=object)
+    os.makedirs(cache_dir, exist_ok=True)
+
+    splitter = StratifiedKFold(n_splits=folds, shuffle=True, random_state=42)
+    fold_indices = list(splitter.split(texts, labels))
+    data_hash = hashlib.sha1('\n'.join(f"{t}\t{l}" for t, l in zip(texts, labels))
+                             .encode('utf-8')).hexdigest()
+
+    vec_configs = expand_grid(vectorizer_grid)
+    clf_configs = expand_grid(classifier_grid)
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(texts, labels, fold_indices, cache_dir, data_hash)) as pool:
+        # Phase 1: one feature build per vectorizer config and fold
+        feature_jobs = [(v, f) for v in vec_configs for f in range(folds)]
+        cached = list(pool.map(_build_features, *zip(*feature_jobs)))
+        print(f"Feature matrices: {sum(cached)} cached, {len(cached) - sum(cached)} built")
+
+        # Phase 2: every classifier config reuses those matrices
+        eval_jobs = [(v, c, f) for v in vec_configs for c in clf_configs for f in range(folds)]
+        scores = list(pool.map(_evaluate, *zip(*eval_jobs)))
+
+    results = {}
+    for (vec_params, clf_params, _), score in zip(eval_jobs, scores):
+        key = json.dumps([vec_params, clf_params], sort_keys=True)
+        results.setdefault(key, (vec_params, clf_params, []))[2].append(score)
+
+    leaderboard = []
+    for vec_params, clf_params, fold_scores in results.values():
+        accuracies, latencies, sizes = zip(*fold_scores)
+        leaderboard.append({
+            'vectorizer': {k: list(v) if isinstance(v, tuple) else v for k, v in vec_params.items()},
+            'classifier': clf_params,
+            'accuracy': float(np.mean(accuracies)),
+            'accuracy_std': float(np.std(accuracies)),
+            'latency_us_per_row': float(np.median(latencies) * 1e6),
+            'model_size_kb': float(np.mean(sizes) / 1024)
+        })
+    leaderboard.sort(key=lambda r: (-r['accuracy'], r['latency_us_per_row']))
+    return leaderboard
+
+# ========================
+# MAIN EXECUTION
+# ========================
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Tune the expense categorizer")
+    parser.add_argument('--data', help="Labeled CSV (defaults to the sample dataset)")
+    parser.add_argument('--folds', type=int, default=5)
+    parser.add_argument('--workers', type=int, default=None, help="Defaults to all cores")
+    parser.add_argument('--cache-dir', default='.tuning_cache')
+    parser.add_argument('--output', default='tuning_leaderboard.json')
+    args = parser.parse_args(argv)
+
+    df = pd.read_csv(args.data) if args.data else create_sample_dataset()
+
+    print("=" * 60)
+    print("HYPERPARAMETER SEARCH")
+    print("=" * 60)
+    start = time.perf_counter()
+    leaderboard = tune(df['transaction'], df['category'], args.folds, args.workers, args.cache_dir)
+    print(f"Search finished in {time.perf_counter() - start:.1f}s")
+
+    print("\n{:<4} {:<34} {:<10} {:>10} {:>12} {:>10}".format(
+        "#", "Vectorizer", "C", "Accuracy", "us/row", "Size KB"))
+    print("-" * 84)
+    for rank, row in enumerate(leaderboard, 1):
+        vec = row['vectorizer']
+        print("{:<4} {:<34} {:<10} {:>9.2f}% {:>12.1f} {:>10.1f}".format(
+            rank,
+            f"max_features={vec['max_features']} ngram={tuple(vec['ngram_range'])}",
+            row['classifier']['C'],
+            row['accuracy'] * 100,
+            row['latency_us_per_row'],
+            row['model_size_kb']
+        ))
+
+    with open(args.output, 'w') as f:
+        json.dump(leaderboard, f, indent=2)
+    print(f"\nLeaderboard saved as {args.output}")
+
+if __name__ == "__main__":
+    main()